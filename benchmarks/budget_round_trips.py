@@ -0,0 +1,107 @@
+"""
+Counts database round trips for one budget check, before and after
+get_budget_status, against a throwaway SQLite database.
+
+    python benchmarks/budget_round_trips.py [--budgets N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Run against a scratch database, never the configured one
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+from sqlalchemy import event, insert  # noqa: E402
+
+from utils import database  # noqa: E402
+from utils.database import (  # noqa: E402
+    DefaultCategory,
+    category_registry,
+    engine,
+    get_budget_by_month,
+    get_budget_status,
+    get_category_name_by_id,
+    get_currency,
+    get_spend_by_month,
+    init_db,
+    save_transaction,
+    save_user,
+    set_budget,
+)
+
+USER_ID = 1
+statements = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_statement(*args):
+    global statements
+    statements += 1
+
+
+def seed(budgets: int):
+    init_db()
+    save_user(USER_ID, "bench")
+    with engine.begin() as connection:
+        connection.execute(insert(DefaultCategory), [
+            dict(name=f"Category {i}", type_of_transaction="expense")
+            for i in range(budgets)
+        ])
+    today = datetime.now()
+    for category_id in range(1, budgets + 1):
+        set_budget(USER_ID, 100.0, category_id, "expense",
+                   today.month, today.year)
+        save_transaction(USER_ID, "expense", 12.5, "bench", today,
+                         category_id, "expense")
+
+
+def per_row_lookups():
+    '''The call sequence check_budget_handler used to make'''
+    today = datetime.now()
+    budgets = get_budget_by_month(USER_ID, today.month, today.year)
+    get_spend_by_month(USER_ID, today.month, today.year)
+    get_currency(USER_ID)
+    for budget in budgets:
+        # Each lookup used to open its own session(s); with the category
+        # registry cold this is the closest equivalent
+        category_registry.invalidate(USER_ID)
+        get_category_name_by_id(budget.category_id, USER_ID)
+
+
+def single_query():
+    today = datetime.now()
+    get_budget_status(USER_ID, today.year, today.month)
+
+
+def measure(name, func, repeat=200):
+    global statements
+    statements = 0
+    func()
+    round_trips = statements
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - started) / repeat * 1000
+
+    print(f"{name:<18} {round_trips:>4} round trips  {elapsed:7.2f} ms/request")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budgets", type=int, default=10)
+    args = parser.parse_args()
+
+    seed(args.budgets)
+    print(f"Budget check with {args.budgets} budgets ({database.engine.url})")
+    measure("per-row lookups", per_row_lookups)
+    measure("get_budget_status", single_query)
+
+
+if __name__ == "__main__":
+    main()
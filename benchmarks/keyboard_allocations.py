@@ -0,0 +1,185 @@
+"""
+Measures what the menu handlers allocate per invocation with the shared
+keyboards in utils.keyboards, against rebuilding each keyboard on every
+call as the handlers used to.
+
+Handlers get stub updates whose replies only record what was sent, so no
+Bot API or database work is counted.
+
+    python benchmarks/keyboard_allocations.py [--calls N]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+# Run against a scratch database, never the configured one
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+from handlers import budget, history, recurring, settings, transaction  # noqa: E402
+from utils import keyboards  # noqa: E402
+
+
+def rebuild(markup: InlineKeyboardMarkup) -> InlineKeyboardMarkup:
+    '''A fresh copy of markup, as the handlers built before they were shared'''
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(button.text, callback_data=button.callback_data)
+         for button in row]
+        for row in markup.inline_keyboard
+    ])
+
+
+def stub_update(data: str = None):
+    '''A message (or, with data, callback query) update that records replies'''
+    sent = []
+
+    async def reply(*args, **kwargs):
+        sent.append(kwargs.get("reply_markup"))
+
+    async def answer(*args, **kwargs):
+        pass
+
+    user = SimpleNamespace(id=1, first_name="Bench")
+    message = SimpleNamespace(from_user=user, reply_text=reply, text="")
+    if data is None:
+        query = None
+    else:
+        # Like PTB's, a callback update has no message of its own
+        query = SimpleNamespace(data=data, from_user=user, answer=answer,
+                                edit_message_text=reply, message=message)
+        message = None
+    update = SimpleNamespace(message=message, callback_query=query,
+                             effective_user=user, effective_chat=user)
+    return update, sent
+
+
+def invoke(handler, update, context):
+    '''Run a handler that never suspends, without an event loop'''
+    coroutine = handler(update, context)
+    try:
+        coroutine.send(None)
+    except StopIteration:
+        return
+    coroutine.close()
+    raise RuntimeError(f"{handler.__name__} awaited something real")
+
+
+# (label, handler, callback data, keyboard it sends)
+CASES = [
+    ("start_transaction", transaction.start_transaction, None,
+     keyboards.TRANSACTION_TYPE_KEYBOARD),
+    ("start_recurring_transaction", recurring.start_recurring_transaction, None,
+     keyboards.TRANSACTION_TYPE_KEYBOARD),
+    ("category_handler_recurring", recurring.category_handler_recurring, "Food",
+     keyboards.FREQUENCY_KEYBOARD),
+    ("start_history", history.start_history, None,
+     keyboards.HISTORY_MENU_KEYBOARD),
+    ("history_choice summary", history.history_choice, "summary",
+     keyboards.SUMMARY_PERIOD_KEYBOARD),
+    ("history_choice charts", history.history_choice, "charts",
+     keyboards.CHART_MENU_KEYBOARD),
+    ("back_history_handler", history.back_history_handler, "back_to_summary",
+     keyboards.SUMMARY_PERIOD_KEYBOARD),
+    ("back_history_handler menu", history.back_history_handler, "start_history",
+     keyboards.HISTORY_MENU_KEYBOARD),
+    ("start_settings", settings.start_settings, None,
+     keyboards.SETTINGS_MENU_KEYBOARD),
+    ("categories_handler", settings.categories_handler, "add_category",
+     keyboards.CATEGORY_TYPE_KEYBOARD),
+    ("categories_handler reset", settings.categories_handler, "reset_data",
+     keyboards.RESET_CONFIRM_KEYBOARD),
+    ("back_settings_handler", settings.back_settings_handler, "back_to_delete_choice",
+     keyboards.CATEGORY_TYPE_KEYBOARD),
+    ("start_budget", budget.start_budget, None,
+     keyboards.BUDGET_MENU_KEYBOARD),
+    ("choice_handler", budget.choice_handler, "set_change_budget",
+     keyboards.budget_month_keyboard()),
+    ("back_budget_handler", budget.back_budget_handler, "back_to_month_selection",
+     keyboards.budget_month_keyboard()),
+]
+
+
+def measure(run, calls: int):
+    '''Blocks and bytes still allocated after calls runs, per run'''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    run(calls)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    return blocks / calls, size / calls
+
+
+def measure_case(handler, data, markup, calls: int):
+    context = SimpleNamespace(user_data={}, args=[])
+    update, sent = stub_update(data)
+    invoke(handler, update, context)  # warm up caches
+    sent.clear()
+
+    # sent keeps every keyboard alive, as a queued request would until it
+    # is serialized, so what each call builds stays in the snapshot
+    def shared(n):
+        for _ in range(n):
+            invoke(handler, update, context)
+
+    def rebuilt(n):
+        for _ in range(n):
+            sent.append(rebuild(markup))
+            invoke(handler, update, context)
+
+    now = measure(shared, calls)
+    sent.clear()
+    old = measure(rebuilt, calls)
+    sent.clear()
+    return now, old
+
+
+def check_month_picker():
+    '''The month picker is rebuilt at month boundaries, and only then'''
+    first = keyboards.budget_month_keyboard(datetime(2025, 1, 1))
+    same = keyboards.budget_month_keyboard(datetime(2025, 1, 31, 23, 59))
+    february = keyboards.budget_month_keyboard(datetime(2025, 2, 1))
+    months = [button.text for button in first.inline_keyboard[0]]
+
+    print(f"January picker shows {months}; "
+          f"same object all month: {first is same}; "
+          f"new object in February: {february is not first}")
+
+
+def main(calls: int):
+    width = max(len(label) for label, *_ in CASES)
+    print(f"{'handler':<{width}}  {'blocks/call':>18}  {'bytes/call':>20}  reduction")
+    total_now = total_old = 0
+    for label, handler, data, markup in CASES:
+        (now_blocks, now_bytes), (old_blocks, old_bytes) = measure_case(
+            handler, data, markup, calls)
+        total_now += now_bytes
+        total_old += old_bytes
+        reduction = (1 - now_bytes / old_bytes) * 100 if old_bytes else 0
+        print(f"{label:<{width}}  {old_blocks:>7.1f} -> {now_blocks:>6.1f}  "
+              f"{old_bytes:>8.0f} -> {now_bytes:>7.0f}  {reduction:>8.1f}%")
+
+    print(f"\nAll handlers: {total_old:.0f} -> {total_now:.0f} bytes per round "
+          f"({(1 - total_now / total_old) * 100:.1f}% less)")
+    check_month_picker()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Handlers log every step; keep the report readable
+    logging.disable(logging.INFO)
+    main(args.calls)
@@ -0,0 +1,248 @@
+"""
+Replays synthetic Telegram updates against the bot's webhook endpoint and
+reports updates/sec, without talking to Telegram.
+
+The bot is built by main.build_application() and served by the same webhook
+server as BOT_MODE=webhook, against a throwaway SQLite database. Calls to
+the Bot API are answered locally after --api-latency-ms, standing in for the
+round trip to Telegram. Each simulated user walks through /start, adding an
+expense, /search and recent /history. Users run in parallel, and each user's
+updates are posted in order, like Telegram delivers them.
+
+    python benchmarks/webhook_load.py [--users N] [--rounds N] [--api-latency-ms MS]
+
+Set CONCURRENT_UPDATES to compare settings.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+# Run against a scratch database, never the configured one
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from telegram.ext import ApplicationBuilder  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+
+import main  # noqa: E402
+from utils import config  # noqa: E402
+from utils.database import (  # noqa: E402
+    Transaction,
+    add_custom_category,
+    engine,
+    init_db,
+    save_user,
+)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Expentrax", "username": "expentrax_bot"}
+SECRET_TOKEN = "load-test"
+URL_PATH = "bench"
+
+
+class OfflineRequest(BaseRequest):
+    '''Answers Bot API calls locally, as if Telegram took latency seconds'''
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter()
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        params = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint in ("sendMessage", "editMessageText"):
+            result = {
+                "message_id": params.get("message_id", 1),
+                "date": int(time.time()),
+                "chat": {"id": params.get("chat_id", 0), "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+
+
+def _chat(user_id: int) -> dict:
+    return {"id": user_id, "type": "private", "first_name": f"User {user_id}"}
+
+
+def message_update(update_id: int, user_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": _chat(user_id),
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": _chat(user_id),
+                "from": BOT_USER,
+                "text": "…",
+            },
+        },
+    }
+
+
+# One round of a user's session: (kind, payload)
+SESSION = [
+    ("message", "/start"),
+    ("message", "/transaction"),
+    ("callback", "Expense"),
+    ("message", "12.50"),
+    ("message", "coffee beans"),
+    ("callback", "Food"),
+    ("message", "/search coffee"),
+    ("message", "/history"),
+    ("callback", "recent"),
+]
+
+
+def seed(users: int):
+    init_db()
+    for user_id in range(1, users + 1):
+        save_user(user_id, f"user{user_id}")
+        add_custom_category(user_id, "Food", "expense")
+
+
+async def replay_user(url, user_id, rounds, next_id, connections, latencies):
+    '''Post one user's updates in order, each once the previous was accepted'''
+    # A client per user keeps httpx's pool small; connections caps the
+    # requests in flight, as Telegram's max_connections does
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET_TOKEN}
+    async with httpx.AsyncClient(headers=headers) as client:
+        for _ in range(rounds):
+            for kind, payload in SESSION:
+                build = message_update if kind == "message" else callback_update
+                update = build(next(next_id), user_id, payload)
+                async with connections:
+                    started = time.perf_counter()
+                    response = await client.post(url, json=update)
+                    latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+
+async def run(args):
+    request = OfflineRequest(args.api_latency_ms / 1000)
+    builder = (
+        ApplicationBuilder()
+        .token("123456:offline")
+        .request(request)
+        .get_updates_request(OfflineRequest(0))
+    )
+    application = main.build_application(builder)
+
+    errors = Counter()
+
+    async def count_error(update, context):
+        errors[type(context.error).__name__] += 1
+
+    application.add_error_handler(count_error)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_webhook(
+        listen="127.0.0.1", port=args.port, url_path=URL_PATH,
+        secret_token=SECRET_TOKEN)
+    await application.start()
+
+    url = f"http://127.0.0.1:{args.port}/{URL_PATH}"
+    next_id = iter(range(1, sys.maxsize))
+    connections = asyncio.Semaphore(config.WEBHOOK_MAX_CONNECTIONS)
+    latencies = []
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        replay_user(url, user_id, args.rounds, next_id, connections, latencies)
+        for user_id in range(1, args.users + 1)
+    ))
+    accepted = time.perf_counter()
+
+    # Same order as run_webhook: stop the server, then drain the handlers
+    await application.updater.stop()
+    await application.stop()
+    drained = time.perf_counter()
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+    with Session(engine) as session:
+        saved = session.scalar(select(func.count()).select_from(Transaction))
+
+    updates = len(latencies)
+    latencies.sort()
+    metrics = application.update_processor.metrics()
+    print(f"concurrent_updates: {config.CONCURRENT_UPDATES}, "
+          f"API latency: {args.api_latency_ms} ms")
+    print(f"updates: {updates} from {args.users} users")
+    print(f"accepted in {accepted - started:.2f}s, "
+          f"handled in {drained - started:.2f}s")
+    print(f"throughput: {updates / (drained - started):.0f} updates/sec")
+    print(f"POST latency: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {latencies[int(updates * 0.99) - 1] * 1000:.1f} ms")
+    print(f"waiting updates: peak {metrics.peak_waiting}, "
+          f"average wait {metrics.average_wait_ms:.1f} ms")
+    print(f"transactions saved: {saved} of {args.users * args.rounds}")
+    print(f"Bot API calls: {dict(request.calls)}")
+    if errors:
+        print(f"handler errors: {dict(errors)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--api-latency-ms", type=float, default=30)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # Handlers log every step; keep the report readable
+    logging.disable(logging.INFO)
+    seed(args.users)
+    asyncio.run(run(args))
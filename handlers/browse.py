@@ -0,0 +1,240 @@
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes
+from telegram.helpers import escape_markdown
+
+from utils.async_database import get_currency, get_transactions_page, run_sync
+from utils.database import category_registry
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+# set higher logging level for httpx to avoid all GET and POST requests being logged
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+logger = logging.getLogger(__name__)
+
+# Transactions shown per page
+BROWSE_PAGE_SIZE = 8
+
+# Everything a page needs lives in its buttons' callback_data, so browsing
+# works without conversation state and old messages keep working. The
+# layout (at most 64 bytes) is
+#     br:<type><range>[<start day>]:<category id>:[<o|n><timestamp>.<id>]
+# type is a(ll), e(xpense) or i(ncome); range is a(ll time), m(onth),
+# d (30 days) or y(ear) starting on <start day>; o/n pages to rows older or
+# newer than the (timestamp, id) cursor. Numbers are base 36.
+PAGE_PREFIX = "br:"
+CATEGORY_PREFIX = "brc:"
+CLOSE = "brx"
+
+TYPES = {"a": None, "e": "expense", "i": "income"}
+TYPE_LABELS = {"a": "All types", "e": "💸 Expenses", "i": "💰 Income"}
+NEXT_TYPE = {"a": "e", "e": "i", "i": "a"}
+NEXT_RANGE = {"a": "m", "m": "d", "d": "y", "y": "a"}
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _to36(number: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    sign, number = ("-", -number) if number < 0 else ("", number)
+    encoded = ""
+    while True:
+        number, remainder = divmod(number, 36)
+        encoded = digits[remainder] + encoded
+        if not number:
+            return sign + encoded
+
+
+def _from36(text: str) -> int:
+    return int(text, 36)
+
+
+class BrowseState(NamedTuple):
+    type_: str = "a"
+    range_: str = "a"
+    start_day: int = 0  # days since 1970-01-01, unused for all time
+    category_id: Optional[int] = None
+    direction: str = ""  # "" for the first page, "o" older, "n" newer
+    cursor: Optional[tuple] = None  # (timestamp, id)
+
+    def filters(self) -> str:
+        day = _to36(self.start_day) if self.range_ != "a" else ""
+        category = _to36(self.category_id) if self.category_id is not None else ""
+        return f"{self.type_}{self.range_}{day}:{category}"
+
+    def encode(self) -> str:
+        cursor = ""
+        if self.direction:
+            timestamp, id = self.cursor
+            micros = (timestamp.replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+            cursor = f"{self.direction}{_to36(micros)}.{_to36(id)}"
+        return f"{PAGE_PREFIX}{self.filters()}:{cursor}"
+
+    @classmethod
+    def decode(cls, data: str) -> "BrowseState":
+        '''Parse "br:..." or "brc:..." callback data'''
+        body = data.split(":", 1)[1]
+        filters, category, *cursor = body.split(":") + [""]
+        state = cls(
+            type_=filters[0],
+            range_=filters[1],
+            start_day=_from36(filters[2:]) if filters[2:] else 0,
+            category_id=_from36(category) if category else None,
+        )
+        if cursor[0]:
+            timestamp, id = cursor[0][1:].split(".")
+            state = state._replace(
+                direction=cursor[0][0],
+                cursor=(EPOCH + timedelta(microseconds=_from36(timestamp)), _from36(id)),
+            )
+        return state
+
+    def first_page(self, **changes) -> "BrowseState":
+        return self._replace(direction="", cursor=None, **changes)
+
+    def date_range(self):
+        '''Half-open [start, end) for the range filter, or (None, None)'''
+        if self.range_ == "a":
+            return None, None
+        start = EPOCH + timedelta(days=self.start_day)
+        if self.range_ == "m":
+            return start, (start + timedelta(days=32)).replace(day=1)
+        if self.range_ == "y":
+            return start, start.replace(year=start.year + 1)
+        return start, start + timedelta(days=30)
+
+    def range_label(self) -> str:
+        start, _ = self.date_range()
+        if self.range_ == "m":
+            return start.strftime("📅 %b %Y")
+        if self.range_ == "y":
+            return start.strftime("📅 %Y")
+        if self.range_ == "d":
+            return "📅 Last 30 days"
+        return "📅 All time"
+
+
+def _next_range(state: BrowseState) -> BrowseState:
+    '''Cycle the date filter, anchoring the new range on today'''
+    range_ = NEXT_RANGE[state.range_]
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = {
+        "a": today,
+        "m": today.replace(day=1),
+        "d": today - timedelta(days=29),
+        "y": today.replace(month=1, day=1),
+    }[range_]
+    return state.first_page(range_=range_, start_day=(start - EPOCH).days)
+
+
+async def browse_page(user_id: int, state: BrowseState):
+    """Build the text and keyboard for one page of the browser."""
+    start, end = state.date_range()
+    rows = await get_transactions_page(
+        user_id,
+        BROWSE_PAGE_SIZE,
+        older_than=state.cursor if state.direction == "o" else None,
+        newer_than=state.cursor if state.direction == "n" else None,
+        type_of_transaction=TYPES[state.type_],
+        category_id=state.category_id,
+        start=start,
+        end=end,
+    )
+    has_more = len(rows) > BROWSE_PAGE_SIZE
+    rows = rows[:BROWSE_PAGE_SIZE]
+
+    # Coming from one side means there is a page on that side
+    has_older = has_more if state.direction != "n" else bool(rows)
+    has_newer = has_more if state.direction == "n" else bool(state.direction)
+
+    categories = await run_sync(category_registry.get, user_id)
+    category = categories.by_id(state.category_id) if state.category_id is not None else None
+    filters = [TYPE_LABELS[state.type_], state.range_label()]
+    if category:
+        filters.append(f"🏷️ {category.name}")
+
+    text = f"🔎 *Transactions* ({escape_markdown(', '.join(filters))})\n\n"
+    if rows:
+        currency = await get_currency(user_id)
+        for transaction, category_name in rows:
+            type_prefix = "💰" if transaction.type_of_transaction == "income" else "💸"
+            text += (
+                f"📅 {transaction.timestamp.strftime('%Y-%m-%d')} | "
+                f"{type_prefix} {currency} {transaction.amount:.2f} | "
+                f"🏷️ *{escape_markdown(category_name or 'Uncategorised')}* | "
+                f"{escape_markdown(transaction.description)}\n"
+            )
+    else:
+        text += "No transactions match these filters."
+
+    navigation = []
+    if rows and has_newer:
+        first = rows[0][0]
+        navigation.append(InlineKeyboardButton("⬅️ Newer", callback_data=state._replace(
+            direction="n", cursor=(first.timestamp, first.id)).encode()))
+    if rows and has_older:
+        last = rows[-1][0]
+        navigation.append(InlineKeyboardButton("Older ➡️", callback_data=state._replace(
+            direction="o", cursor=(last.timestamp, last.id)).encode()))
+
+    keyboard = [navigation] if navigation else []
+    keyboard.append([
+        InlineKeyboardButton(TYPE_LABELS[state.type_], callback_data=state.first_page(
+            type_=NEXT_TYPE[state.type_], category_id=None).encode()),
+        InlineKeyboardButton(state.range_label(), callback_data=_next_range(state).encode()),
+        InlineKeyboardButton("🏷️ Category", callback_data=CATEGORY_PREFIX + state.filters()),
+    ])
+    keyboard.append([InlineKeyboardButton("✖️ Close", callback_data=CLOSE)])
+
+    return text.strip(), InlineKeyboardMarkup(keyboard)
+
+
+async def browse_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the page, filter change or close encoded in the button pressed"""
+    query = update.callback_query
+    await query.answer()
+
+    if query.data == CLOSE:
+        await query.edit_message_reply_markup(reply_markup=None)
+        return
+
+    state = BrowseState.decode(query.data)
+    logger.info("Browse %s, User: %s", state, query.from_user.first_name)
+
+    text, reply_markup = await browse_page(update.effective_chat.id, state)
+    await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode='Markdown')
+
+
+async def browse_category_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Let the user pick a category to filter the browser by"""
+    query = update.callback_query
+    await query.answer()
+
+    state = BrowseState.decode(query.data)
+    categories = await run_sync(category_registry.get, update.effective_chat.id)
+    types = [TYPES[state.type_]] if TYPES[state.type_] else ["expense", "income"]
+
+    buttons = [
+        InlineKeyboardButton(name, callback_data=state.first_page(
+            category_id=categories.by_name(name).id).encode())
+        for type_ in types
+        for name in categories.names(type_)
+    ]
+    keyboard = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+    keyboard.append([
+        InlineKeyboardButton("All categories", callback_data=state.first_page(
+            category_id=None).encode()),
+    ])
+
+    await query.edit_message_text(
+        text="🏷️ Which category would you like to see?",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
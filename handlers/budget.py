@@ -1,20 +1,23 @@
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 
-from utils.database import (
-    get_categories_name,
+from utils.async_database import (
     get_category_id,
     get_category_type,
     get_currency,
     set_budget,
-    get_budget_by_month,
-    get_spend_by_month,
-    get_category_name_by_id,
+    get_budget_status,
 )
-from utils.misc import list_chunker, is_valid_currency
+from utils.keyboards import (
+    BUDGET_MENU_KEYBOARD,
+    BUDGET_MONTH_PROMPT,
+    budget_month_keyboard,
+    category_keyboard,
+)
+from utils.misc import is_valid_currency
 
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
@@ -26,25 +29,12 @@ logger = logging.getLogger(__name__)
 CHOICE, MONTH_SELECTION, CATEGORY_SELECTION, AMOUNT_INPUT, CHANGE_CATEGORY, CHANGE_AMOUNT = range(
     6)
 
-# Keyboards
-EXPENSE_CATEGORIES = list_chunker(
-    categories=get_categories_name("expense"), chunk_size=3)
-
 
 async def start_budget(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Starts the budget conversation."""
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                "Set/Change", callback_data="set_change_budget"),
-            InlineKeyboardButton("Check", callback_data="check_budget"),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     await update.message.reply_text(
         "Welcome to the budget manager! What would you like to do?",
-        reply_markup=reply_markup,
+        reply_markup=BUDGET_MENU_KEYBOARD,
     )
 
     return CHOICE
@@ -59,23 +49,9 @@ async def choice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     context.user_data['budget_choice'] = choice
 
     if choice == "set_change_budget":
-        today = datetime.now()
-        next_month = today + timedelta(days=31)
-
-        keyboard = [
-            [
-                InlineKeyboardButton(today.strftime(
-                    "%B %Y"), callback_data=today.strftime("%B %Y")),
-                InlineKeyboardButton(next_month.strftime(
-                    "%B %Y"), callback_data=next_month.strftime("%B %Y")),
-            ],
-            [InlineKeyboardButton("Back", callback_data="start_budget")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         await query.edit_message_text(
-            text="Which month are you setting or changing the budget for?",
-            reply_markup=reply_markup,
+            text=BUDGET_MONTH_PROMPT,
+            reply_markup=budget_month_keyboard(),
         )
         return MONTH_SELECTION
 
@@ -96,14 +72,11 @@ async def month_selection_handler(update: Update, context: ContextTypes.DEFAULT_
     context.user_data['budget_month'] = month_number
     context.user_data['budget_year'] = int(year)
 
-    keyboard = [
-        [InlineKeyboardButton(category, callback_data=category)
-         for category in row]
-        for row in EXPENSE_CATEGORIES
-    ]
-    keyboard.append([InlineKeyboardButton(
-        "Back", callback_data="back_to_month_selection")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = await category_keyboard(
+        update.effective_chat.id,
+        "expense",
+        footer=(("Back", "back_to_month_selection"),)
+    )
 
     await query.edit_message_text(
         text="Please select a category to set or change the budget for.",
@@ -138,11 +111,11 @@ async def amount_input_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     context.user_data['budget_amount'] = float(amount)
 
     category_name = context.user_data['budget_category_name']
-    category_id = get_category_id(category_name)
-    category_type = get_category_type(category_id)
-    currency = get_currency(update.effective_chat.id)
+    category_id = await get_category_id(category_name, user.id)
+    category_type = await get_category_type(category_id, user.id)
+    currency = await get_currency(update.effective_chat.id)
 
-    set_budget(
+    await set_budget(
         user_id=user.id,
         budgeted_amount=context.user_data['budget_amount'],
         category_id=category_id,
@@ -167,40 +140,28 @@ async def check_budget_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = update.effective_chat.id
     today = datetime.now()
 
-    budgets = get_budget_by_month(user_id, today.month, today.year)
-    spends = get_spend_by_month(user_id, today.month, today.year)
-    currency = get_currency(update.effective_chat.id)
+    # Budgets, spending, names, totals and currency in one round trip
+    budgets = await get_budget_status(user_id, today.year, today.month)
 
     if not budgets:
         await update.callback_query.edit_message_text(text="You have not set any budgets for this month.")
         return
 
+    currency = budgets[0].currency
     message = f"📊 *Budget Status for {today.strftime('%B %Y')}*\n\n"
-    total_budgeted = 0
-    total_spent = 0
-
-    spend_dict = {spend.category_id: spend.total_spent for spend in spends}
 
     for budget in budgets:
-        category_name = get_category_name_by_id(budget.category_id)
-        budgeted = budget.budgeted_amount
-        spent = spend_dict.get(budget.category_id, 0)
-        remaining = budgeted - spent
-
-        total_budgeted += budgeted
-        total_spent += spent
+        emoji = "✅" if budget.remaining >= 0 else "❌"
+        message += f"*{budget.category_name}*:\n"
+        message += f"  - Budgeted: {currency} {budget.budgeted:.2f}\n"
+        message += f"  - Spent: {currency} {budget.spent:.2f}\n"
+        message += f"  - Remaining: {currency} {budget.remaining:.2f} {emoji}\n\n"
 
-        emoji = "✅" if remaining >= 0 else "❌"
-        message += f"*{category_name}*:\n"
-        message += f"  - Budgeted: {currency} {budgeted:.2f}\n"
-        message += f"  - Spent: {currency} {spent:.2f}\n"
-        message += f"  - Remaining: {currency} {remaining:.2f} {emoji}\n\n"
-
-    total_remaining = total_budgeted - total_spent
+    totals = budgets[0]
     message += f"*Overall Summary*:\n"
-    message += f"  - Total Budgeted: {currency} {total_budgeted:.2f}\n"
-    message += f"  - Total Spent: {currency} {total_spent:.2f}\n"
-    message += f"  - Total Remaining: {currency} {total_remaining:.2f}\n"
+    message += f"  - Total Budgeted: {currency} {totals.total_budgeted:.2f}\n"
+    message += f"  - Total Spent: {currency} {totals.total_spent:.2f}\n"
+    message += f"  - Total Remaining: {currency} {totals.total_remaining:.2f}\n"
 
     await update.callback_query.edit_message_text(text=message, parse_mode='Markdown')
 
@@ -213,23 +174,9 @@ async def back_budget_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     if query.data == "start_budget":
         return await start_budget(update, context)
     elif query.data == "back_to_month_selection":
-        today = datetime.now()
-        next_month = today + timedelta(days=31)
-
-        keyboard = [
-            [
-                InlineKeyboardButton(today.strftime(
-                    "%B %Y"), callback_data=today.strftime("%B %Y")),
-                InlineKeyboardButton(next_month.strftime(
-                    "%B %Y"), callback_data=next_month.strftime("%B %Y")),
-            ],
-            [InlineKeyboardButton("Back", callback_data="start_budget")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         await query.edit_message_text(
-            text="Which month are you setting or changing the budget for?",
-            reply_markup=reply_markup,
+            text=BUDGET_MONTH_PROMPT,
+            reply_markup=budget_month_keyboard(),
         )
         return MONTH_SELECTION
 
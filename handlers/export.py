@@ -0,0 +1,107 @@
+from datetime import date
+
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes, ConversationHandler
+
+from utils.async_database import run_sync
+from utils.exporters import FILE_EXTENSIONS, available_formats, export_transactions
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+# set higher logging level for httpx to avoid all GET and POST requests being logged
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+logger = logging.getLogger(__name__)
+
+# Conversation states
+FORMAT = 0
+
+# Bots can't upload files bigger than this to Telegram
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+
+FORMAT_LABELS = {"csv": "CSV", "jsonl": "JSON Lines", "parquet": "Parquet"}
+
+
+async def start_export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Ask which format to export the user's history in."""
+    keyboard = [
+        [
+            InlineKeyboardButton(FORMAT_LABELS[file_format],
+                                 callback_data=f"export_{file_format}")
+            for file_format in available_formats()
+        ]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    logger.info("Export conversation started, User: %s",
+                update.message.from_user.first_name)
+
+    await update.message.reply_text(
+        "📤 Which format would you like your transactions in?",
+        reply_markup=reply_markup,
+    )
+
+    return FORMAT
+
+
+async def format_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Export the history off the event loop and send it as a document."""
+    query = update.callback_query
+    await query.answer()
+    file_format = query.data.removeprefix("export_")
+
+    if file_format not in available_formats():
+        await query.edit_message_text(
+            text="❓ Oops! Please pick one of the formats above.")
+        return FORMAT
+
+    await query.edit_message_text(text="⏳ Preparing your export...")
+
+    stream, count = await run_sync(
+        export_transactions, update.effective_chat.id, file_format)
+    with stream:
+        if count == 0:
+            await query.edit_message_text(
+                text="🤷 You don't have any transactions to export yet.")
+            return ConversationHandler.END
+
+        size = stream.seek(0, 2)
+        if size > MAX_UPLOAD_SIZE:
+            await query.edit_message_text(
+                text="❌ Your export is larger than Telegram's 50 MB limit. "
+                "Please try the Parquet format, which is much smaller.")
+            return ConversationHandler.END
+        stream.seek(0)
+
+        # The upload is read into memory either way; the size check above
+        # bounds it
+        await context.bot.send_document(
+            chat_id=update.effective_chat.id,
+            document=stream.read(),
+            filename=f"expentrax-{date.today():%Y-%m-%d}.{FILE_EXTENSIONS[file_format]}",
+            caption=f"📄 {count} transaction(s)",
+        )
+
+    logger.info("Exported %d transaction(s) as %s, User: %s",
+                count, file_format, query.from_user.first_name)
+    await query.edit_message_text(text="✅ Here's your export!")
+
+    return ConversationHandler.END
+
+
+async def cancel_export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Cancels and ends the conversation."""
+    user = update.message.from_user
+
+    logger.info("User %s canceled the conversation.", user.first_name)
+
+    await update.message.reply_text(
+        "❌ Export cancelled."
+    )
+
+    return ConversationHandler.END
@@ -1,7 +1,17 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
-
-from utils.database import get_period_total, get_recent_transactions, get_summary_periods, get_currency, get_category_name_by_id
+from telegram.helpers import escape_markdown
+
+from utils.async_database import get_period_breakdown, get_recent_transactions_with_category, get_summary_periods, get_currency, get_monthly_totals
+from utils.charts import chart_spec, send_chart
+from utils.keyboards import (
+    CHART_MENU_KEYBOARD,
+    HISTORY_MENU_KEYBOARD,
+    HISTORY_MENU_PROMPT,
+    SUMMARY_PERIOD_KEYBOARD,
+    SUMMARY_PERIOD_PROMPT,
+)
+from handlers.browse import BrowseState, browse_page
 from datetime import datetime
 
 import logging
@@ -17,26 +27,28 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 # Conversation states
-CHOICE, SUMMARY, WEEKLY, MONTHLY, YEARLY = range(5)
+CHOICE, SUMMARY, WEEKLY, MONTHLY, YEARLY, CHARTS = range(6)
+
+# Number of periods shown per page of the summary keyboard
+PERIODS_PAGE_SIZE = 9
+
+# Categories listed per transaction type in a period summary
+SUMMARY_CATEGORY_LIMIT = 8
+
+# Bars on the yearly category chart, and months on the trend chart
+CHART_CATEGORY_LIMIT = 10
+CHART_TREND_MONTHS = 12
 
 # Start the history conversation
 
 
 async def start_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    keyboard = [
-        [
-            InlineKeyboardButton("Recent ✅", callback_data="recent"),
-            InlineKeyboardButton("Summary 📊", callback_data="summary"),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     logger.info("History conversation started, User: %s",
                 update.message.from_user.first_name)
 
     await update.message.reply_text(
-        "📋 Welcome to the transaction history! What would you like to do?",
-        reply_markup=reply_markup,
+        HISTORY_MENU_PROMPT,
+        reply_markup=HISTORY_MENU_KEYBOARD,
     )
 
     return CHOICE
@@ -54,27 +66,34 @@ async def history_choice(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if choice == "recent":
         return await recent_handler(update, context)
 
-    elif choice == "summary":
-        keyboard = [
-            [
-                InlineKeyboardButton("Weekly", callback_data="weekly"),
-                InlineKeyboardButton("Monthly", callback_data="monthly"),
-                InlineKeyboardButton("Yearly", callback_data="yearly"),
-            ],
-            [InlineKeyboardButton("Back", callback_data="start_history")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    elif choice == "browse":
+        # Paging is handled by browse_handler outside this conversation; the
+        # page state travels in the buttons
+        text, reply_markup = await browse_page(update.effective_chat.id, BrowseState())
+        await query.edit_message_text(
+            text=text, reply_markup=reply_markup, parse_mode='Markdown')
 
+        return ConversationHandler.END
+
+    elif choice == "summary":
         await query.edit_message_text(
-            text="📅 Please specify a summary period:",
-            reply_markup=reply_markup
+            text=SUMMARY_PERIOD_PROMPT,
+            reply_markup=SUMMARY_PERIOD_KEYBOARD
         )
 
         return SUMMARY
 
+    elif choice == "charts":
+        await query.edit_message_text(
+            text="📈 Which chart would you like to see?",
+            reply_markup=CHART_MENU_KEYBOARD
+        )
+
+        return CHARTS
+
     else:
         await query.edit_message_text(
-            text="❓ Oops! Please select 'Recent' or 'Summary'.\n"
+            text="❓ Oops! Please select 'Recent', 'Summary', 'Charts' or 'Browse'.\n"
             "📝 Note: Weekly, Monthly, and Yearly options show summaries instead of individual transactions."
         )
         return CHOICE
@@ -86,10 +105,11 @@ async def recent_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await query.answer()
     user = query.from_user
     user_id = update.effective_chat.id
-    currency = get_currency(update.effective_chat.id)
+    currency = await get_currency(update.effective_chat.id)
 
     # Read the transactions from database
-    transactions = get_recent_transactions(user_id)
+    # Category names come back with the rows, no per-row lookups
+    transactions = await get_recent_transactions_with_category(user_id)
     logger.info("Recent transactions: %s, User: %s",
                 transactions, user.first_name)
 
@@ -101,14 +121,14 @@ async def recent_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return ConversationHandler.END
 
     message = "📄 *Here are your recent transactions:*\n\n"
-    for transaction in transactions:
+    for transaction, category_name in transactions:
         type_prefix = "💰 Income" if transaction.type_of_transaction == "income" else "💸 Expense"
 
         message += (
             f"📅 {transaction.timestamp.strftime('%Y-%m-%d')} | "
             f"{type_prefix} | "
             f"💵 {currency} {transaction.amount:.2f} | "
-            f"🏷️ *{get_category_name_by_id(transaction.category_id)}* | "
+            f"🏷️ *{category_name}* | "
             f"{transaction.description}\n"
         )
 
@@ -123,14 +143,27 @@ async def summary_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """Show summary transactions by the user"""
     query = update.callback_query
     await query.answer()
-    summary_choice = query.data
 
-    logger.info("Summary period: %s, User: %s",
-                summary_choice, query.from_user.first_name)
+    # Paging buttons carry "periods_<choice>_<page>"
+    if query.data.startswith("periods_"):
+        _, summary_choice, page = query.data.split('_')
+        page = int(page)
+    else:
+        summary_choice, page = query.data, 0
 
-    # Read the transactions from database
+    logger.info("Summary period: %s, page: %s, User: %s",
+                summary_choice, page, query.from_user.first_name)
+
+    # Read one page of periods (plus one to know if there are older ones)
     user_id = update.effective_chat.id
-    periods = get_summary_periods(user_id, summary_choice.lower())
+    periods = await get_summary_periods(
+        user_id,
+        summary_choice.lower(),
+        limit=PERIODS_PAGE_SIZE + 1,
+        offset=page * PERIODS_PAGE_SIZE
+    )
+    has_older = len(periods) > PERIODS_PAGE_SIZE
+    periods = periods[:PERIODS_PAGE_SIZE]
     context.user_data['periods'] = periods
 
     row_size = 3
@@ -140,6 +173,17 @@ async def summary_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
          for period in periods[i:i + row_size]]
         for i in range(0, len(periods), row_size)
     ]
+
+    navigation = []
+    if has_older:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Older", callback_data=f"periods_{summary_choice}_{page + 1}"))
+    if page > 0:
+        navigation.append(InlineKeyboardButton(
+            "Newer ➡️", callback_data=f"periods_{summary_choice}_{page - 1}"))
+    if navigation:
+        keyboard.append(navigation)
+
     keyboard.append([InlineKeyboardButton(
         "⬅️ Back", callback_data="back_to_summary")])
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -179,6 +223,38 @@ async def summary_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return YEARLY
 
 
+def breakdown_text(breakdown, currency: str) -> str:
+    """Per-category totals and top descriptions for a period summary."""
+    sections = []
+
+    for type_, title in (("expense", "💸 *Spending by category*"), ("income", "💰 *Income by category*")):
+        categories = breakdown.categories_for(type_)
+        if not categories:
+            continue
+
+        total = breakdown.total_expense if type_ == "expense" else breakdown.total_income
+        lines = [title]
+        for category in categories[:SUMMARY_CATEGORY_LIMIT]:
+            share = category.total / total * 100 if total else 0
+            name = escape_markdown(category.name or "Uncategorised")
+            lines.append(
+                f"🏷️ {name}: {currency} {category.total:.2f} ({share:.0f}%)")
+        if len(categories) > SUMMARY_CATEGORY_LIMIT:
+            lines.append(
+                f"…and {len(categories) - SUMMARY_CATEGORY_LIMIT} more")
+        sections.append("\n".join(lines))
+
+    top = breakdown.top_descriptions_for("expense")
+    if top:
+        lines = ["🔝 *Top spending*"]
+        for rank, entry in enumerate(top, start=1):
+            lines.append(f"{rank}. {escape_markdown(entry.description)}: "
+                         f"{currency} {entry.total:.2f} ({entry.count}×)")
+        sections.append("\n".join(lines))
+
+    return "".join("\n\n" + section for section in sections)
+
+
 async def weekly_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -189,7 +265,7 @@ async def weekly_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     year_choice, week_choice = user_choice[2], user_choice[1]
 
-    week_total = get_period_total(
+    week_total = await get_period_breakdown(
         user_id,
         period_type='week',
         target_year=int(year_choice),
@@ -200,13 +276,14 @@ async def weekly_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     net_amount = week_total.total_income - week_total.total_expense
     emoji = "📈" if net_amount >= 0 else "📉"
-    currency = get_currency(update.effective_chat.id)
+    currency = await get_currency(update.effective_chat.id)
 
     await query.edit_message_text(
         text=f"📊 *Weekly Summary ({year_choice} Week {week_choice})*\n\n"
         f"💰 Total Income: *{currency} {week_total.total_income:.2f}*\n"
         f"💸 Total Expense: *{currency} {week_total.total_expense:.2f}*\n"
-        f"💡 Net: *{currency} {net_amount:.2f}* {emoji}",
+        f"💡 Net: *{currency} {net_amount:.2f}* {emoji}"
+        f"{breakdown_text(week_total, currency)}",
         parse_mode='Markdown'
     )
 
@@ -223,7 +300,7 @@ async def monthly_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     month_choice, year_choice = user_choice[0], user_choice[1]
 
-    month_total = get_period_total(
+    month_total = await get_period_breakdown(
         user_id,
         period_type='month',
         target_year=int(year_choice),
@@ -234,13 +311,14 @@ async def monthly_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     net_amount = month_total.total_income - month_total.total_expense
     emoji = "📈" if net_amount >= 0 else "📉"
-    currency = get_currency(update.effective_chat.id)
+    currency = await get_currency(update.effective_chat.id)
 
     await query.edit_message_text(
         text=f"📊 *Monthly Summary ({month_choice} {year_choice})*\n\n"
         f"💰 Total Income: *{currency} {month_total.total_income:.2f}*\n"
         f"💸 Total Expense: *{currency} {month_total.total_expense:.2f}*\n"
-        f"💡 Net: *{currency} {net_amount:.2f}* {emoji}",
+        f"💡 Net: *{currency} {net_amount:.2f}* {emoji}"
+        f"{breakdown_text(month_total, currency)}",
         parse_mode='Markdown'
     )
 
@@ -255,7 +333,7 @@ async def yearly_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     year_choice = query.data
 
-    year_total = get_period_total(
+    year_total = await get_period_breakdown(
         user_id,
         period_type='year',
         target_year=int(year_choice)
@@ -265,40 +343,98 @@ async def yearly_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     net_amount = year_total.total_income - year_total.total_expense
     emoji = "📈" if net_amount >= 0 else "📉"
-    currency = get_currency(update.effective_chat.id)
+    currency = await get_currency(update.effective_chat.id)
 
     await query.edit_message_text(
         text=f"📊 *Yearly Summary ({year_choice})*\n\n"
         f"💰 Total Income: *{currency} {year_total.total_income:.2f}*\n"
         f"💸 Total Expense: *{currency} {year_total.total_expense:.2f}*\n"
-        f"💡 Net: *{currency} {net_amount:.2f}* {emoji}",
+        f"💡 Net: *{currency} {net_amount:.2f}* {emoji}"
+        f"{breakdown_text(year_total, currency)}",
         parse_mode='Markdown'
     )
 
     return ConversationHandler.END
 
 
+async def chart_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Draw the chosen chart in the chart workers and send it as a photo"""
+    query = update.callback_query
+    await query.answer()
+    user_id = update.effective_chat.id
+    currency = await get_currency(user_id)
+    today = datetime.now()
+
+    logger.info("Chart: %s, User: %s", query.data, query.from_user.first_name)
+
+    # Charts are built from the cached summaries and period totals
+    if query.data == "chart_pie":
+        breakdown = await get_period_breakdown(
+            user_id, period_type='month', target_year=today.year, target_month=today.month)
+        categories = breakdown.categories_for("expense")
+        spec = chart_spec(
+            "pie", f"Spending by category, {today:%b %Y}",
+            [category.name or "Uncategorised" for category in categories],
+            {"Expense": [category.total for category in categories]},
+            currency,
+        )
+        has_data = bool(categories)
+
+    elif query.data == "chart_bar":
+        breakdown = await get_period_breakdown(
+            user_id, period_type='year', target_year=today.year)
+        categories = breakdown.categories_for("expense")[:CHART_CATEGORY_LIMIT]
+        spec = chart_spec(
+            "bar", f"Top spending categories, {today.year}",
+            [category.name or "Uncategorised" for category in categories],
+            {"Expense": [category.total for category in categories]},
+            currency,
+        )
+        has_data = bool(categories)
+
+    else:
+        months = await get_monthly_totals(user_id, CHART_TREND_MONTHS)
+        spec = chart_spec(
+            "line", "Income and expense per month",
+            [datetime(row.year, row.month, 1).strftime("%b %y") for row in months],
+            {
+                "Income": [row.total_income for row in months],
+                "Expense": [row.total_expense for row in months],
+            },
+            currency,
+        )
+        has_data = bool(months)
+
+    if not has_data:
+        await query.edit_message_text(
+            text="🔍 Nothing to chart yet. Try adding some transactions first!"
+        )
+        return ConversationHandler.END
+
+    await query.edit_message_text(text="🎨 Drawing your chart...")
+    await send_chart(context.bot, user_id, spec)
+    await query.edit_message_text(text="📈 Here's your chart!")
+
+    return ConversationHandler.END
+
+
 async def back_history_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the back button in the history conversation."""
     query = update.callback_query
     await query.answer()
 
     if query.data == "start_history":
-        return await start_history(update, context)
-    elif query.data == "back_to_summary":
-        keyboard = [
-            [
-                InlineKeyboardButton("Weekly 📅", callback_data="weekly"),
-                InlineKeyboardButton("Monthly 📅", callback_data="monthly"),
-                InlineKeyboardButton("Yearly 📅", callback_data="yearly"),
-            ],
-            [InlineKeyboardButton("⬅️ Back", callback_data="start_history")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # A button press has no message to reply to; show the menu in place
+        await query.edit_message_text(
+            text=HISTORY_MENU_PROMPT,
+            reply_markup=HISTORY_MENU_KEYBOARD
+        )
 
+        return CHOICE
+    elif query.data == "back_to_summary":
         await query.edit_message_text(
-            text="📅 Please specify a summary period:",
-            reply_markup=reply_markup
+            text=SUMMARY_PERIOD_PROMPT,
+            reply_markup=SUMMARY_PERIOD_KEYBOARD
         )
 
         return SUMMARY
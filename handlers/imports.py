@@ -0,0 +1,112 @@
+import csv
+import os
+import tempfile
+
+from telegram import Update
+from telegram.ext import ContextTypes, ConversationHandler
+
+from utils.async_database import run_sync
+from utils.importers import detect_format, import_transactions
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+# set higher logging level for httpx to avoid all GET and POST requests being logged
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+logger = logging.getLogger(__name__)
+
+# Conversation states
+UPLOAD = 0
+
+# Bots can't download files bigger than this from Telegram
+MAX_FILE_SIZE = 20 * 1024 * 1024
+
+
+async def start_import(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Ask for the bank export to import."""
+    logger.info("Import conversation started, User: %s",
+                update.message.from_user.first_name)
+
+    await update.message.reply_text(
+        "📥 Send me your bank export as a file (CSV, OFX or QFX).\n"
+        "_CSV files need a date column and an amount (or debit/credit) column. "
+        "Description and category columns are used when present._\n\n"
+        "Type /cancel to stop.",
+        parse_mode='Markdown',
+    )
+
+    return UPLOAD
+
+
+async def upload_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Download the uploaded file and import it off the event loop."""
+    document = update.message.document
+
+    if document.file_size and document.file_size > MAX_FILE_SIZE:
+        await update.message.reply_text(
+            "❌ That file is too big. Please send one under 20 MB, "
+            "e.g. by exporting a shorter date range."
+        )
+        return UPLOAD
+
+    file_format = detect_format(document.file_name, b"")
+    if file_format is None and document.file_name and "." in document.file_name:
+        await update.message.reply_text(
+            "❌ I can only import CSV, OFX or QFX files. Please try another file."
+        )
+        return UPLOAD
+
+    progress = await update.message.reply_text("⏳ Importing your transactions...")
+
+    handle, path = tempfile.mkstemp(prefix="expentrax-import-")
+    os.close(handle)
+    try:
+        telegram_file = await document.get_file()
+        await telegram_file.download_to_drive(path)
+
+        if file_format is None:
+            with open(path, "rb") as stream:
+                file_format = detect_format(None, stream.read(512))
+        if file_format is None:
+            await progress.edit_text(
+                "❌ I couldn't tell what kind of file that is. Please send a CSV, OFX or QFX file."
+            )
+            return UPLOAD
+
+        summary = await run_sync(
+            import_transactions, update.effective_chat.id, path, file_format)
+    except (ValueError, csv.Error) as error:
+        await progress.edit_text(f"❌ {error}. Please check the file and try again.")
+        return UPLOAD
+    finally:
+        os.remove(path)
+
+    lines = [f"✅ Imported {summary.imported} transaction(s)."]
+    if summary.duplicates:
+        lines.append(
+            f"↩️ Skipped {summary.duplicates} already in your history.")
+    if summary.skipped:
+        lines.append(
+            f"⚠️ Skipped {summary.skipped} row(s) without a readable date or amount.")
+
+    await progress.edit_text("\n".join(lines))
+
+    return ConversationHandler.END
+
+
+async def cancel_import(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Cancels and ends the conversation."""
+    user = update.message.from_user
+
+    logger.info("User %s canceled the conversation.", user.first_name)
+
+    await update.message.reply_text(
+        "❌ Import cancelled."
+    )
+
+    return ConversationHandler.END
@@ -1,9 +1,10 @@
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 from datetime import datetime
 
-from utils.database import save_recurring_transaction, get_category_id, get_categories_name, get_category_type, get_currency
-from utils.misc import is_valid_currency, list_chunker
+from utils.async_database import save_recurring_transaction, get_category_id, get_category_type, get_currency
+from utils.keyboards import FREQUENCY_KEYBOARD, TRANSACTION_TYPE_KEYBOARD, category_keyboard
+from utils.misc import is_valid_currency
 
 import logging
 
@@ -16,24 +17,12 @@ logger = logging.getLogger(__name__)
 # Conversation states
 TYPE, AMOUNT, DESCRIPTION, CATEGORY, FREQUENCY, START_DATE, END_DATE = range(7)
 
-# Categories
-EXPENSE_CATEGORIES = list_chunker(
-    categories=get_categories_name("expense"), chunk_size=3)
-INCOME_CATEGORIES = list_chunker(
-    categories=get_categories_name("income"), chunk_size=3)
-
 
 async def start_recurring_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the conversation and ask for transaction type."""
-    keyboard = [
-        [
-            InlineKeyboardButton("💸 Expense", callback_data="Expense"),
-            InlineKeyboardButton("💰 Income", callback_data="Income"),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
-        "Let's set up a recurring transaction. Is it an income or an expense? 💰", reply_markup=reply_markup
+        "Let's set up a recurring transaction. Is it an income or an expense? 💰",
+        reply_markup=TRANSACTION_TYPE_KEYBOARD
     )
     return TYPE
 
@@ -74,10 +63,8 @@ async def description_handler_recurring(update: Update, context: ContextTypes.DE
     context.user_data['description'] = update.message.text
     logger.info("Recurring transaction description: %s, User: %s",
                 context.user_data['description'], user.first_name)
-    categories = INCOME_CATEGORIES if context.user_data['type'] == "Income" else EXPENSE_CATEGORIES
-    keyboard = [[InlineKeyboardButton(
-        category, callback_data=category) for category in row] for row in categories]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = await category_keyboard(
+        update.effective_chat.id, context.user_data['type'].lower())
     await update.message.reply_text(
         f"Great! Which category best describes this recurring {context.user_data['type'].lower()}? 👇",
         reply_markup=reply_markup,
@@ -93,16 +80,8 @@ async def category_handler_recurring(update: Update, context: ContextTypes.DEFAU
     context.user_data['category_name'] = query.data
     logger.info("Recurring transaction category: %s, User: %s",
                 context.user_data['category_name'], query.from_user.first_name)
-    keyboard = [
-        [
-            InlineKeyboardButton("Daily", callback_data="daily"),
-            InlineKeyboardButton("Weekly", callback_data="weekly"),
-            InlineKeyboardButton("Monthly", callback_data="monthly"),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(
-        text="How often should this transaction repeat?", reply_markup=reply_markup
+        text="How often should this transaction repeat?", reply_markup=FREQUENCY_KEYBOARD
     )
     return FREQUENCY
 
@@ -156,11 +135,13 @@ async def end_date_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
                 context.user_data['end_date'], user.first_name)
 
     category_name = context.user_data['category_name']
-    category_id = get_category_id(category_name)
-    category_type = get_category_type(category_id)
-    currency = get_currency(update.effective_chat.id)
+    category_id = await get_category_id(
+        category_name, update.effective_chat.id)
+    category_type = await get_category_type(
+        category_id, update.effective_chat.id)
+    currency = await get_currency(update.effective_chat.id)
 
-    save_recurring_transaction(
+    await save_recurring_transaction(
         user_id=update.effective_chat.id,
         type_of_transaction=context.user_data['type'].lower(),
         amount=float(context.user_data['amount']),
@@ -0,0 +1,102 @@
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes
+from telegram.helpers import escape_markdown
+
+from handlers.browse import CLOSE
+from utils.async_database import get_currency, search_transactions
+from utils.database import search_terms
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+# set higher logging level for httpx to avoid all GET and POST requests being logged
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+logger = logging.getLogger(__name__)
+
+# Results shown per page
+SEARCH_PAGE_SIZE = 8
+
+# Page buttons carry the search in their callback_data as
+#     sr:<offset>:<search words>
+# so paging needs no conversation state. Callback data is capped at 64
+# bytes, so very long searches page through their first few words only.
+PAGE_PREFIX = "sr:"
+MAX_CALLBACK_DATA = 64
+
+
+def _page_data(offset: int, terms) -> str:
+    '''Callback data for a results page, dropping words that don't fit'''
+    prefix = f"{PAGE_PREFIX}{offset}:"
+    query = " ".join(terms)
+    while len((prefix + query).encode("utf-8")) > MAX_CALLBACK_DATA:
+        query = query.rsplit(" ", 1)[0] if " " in query else query[:-1]
+    return prefix + query
+
+
+async def search_page(user_id: int, query: str, offset: int = 0):
+    """Build the text and keyboard for one page of search results."""
+    rows = await search_transactions(user_id, query, SEARCH_PAGE_SIZE, offset)
+    has_more = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+    terms = search_terms(query)
+
+    text = f"🔍 *Results for* \"{escape_markdown(' '.join(terms))}\"\n\n"
+    if rows:
+        currency = await get_currency(user_id)
+        for transaction, category_name in rows:
+            type_prefix = "💰" if transaction.type_of_transaction == "income" else "💸"
+            text += (
+                f"📅 {transaction.timestamp.strftime('%Y-%m-%d')} | "
+                f"{type_prefix} {currency} {transaction.amount:.2f} | "
+                f"🏷️ *{escape_markdown(category_name or 'Uncategorised')}* | "
+                f"{escape_markdown(transaction.description)}\n"
+            )
+    elif offset:
+        text += "No more matches."
+    else:
+        text += "No transactions match your search."
+
+    navigation = []
+    if offset:
+        navigation.append(InlineKeyboardButton("⬅️ Previous", callback_data=_page_data(
+            max(offset - SEARCH_PAGE_SIZE, 0), terms)))
+    if has_more:
+        navigation.append(InlineKeyboardButton("Next ➡️", callback_data=_page_data(
+            offset + SEARCH_PAGE_SIZE, terms)))
+
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("✖️ Close", callback_data=CLOSE)])
+
+    return text.strip(), InlineKeyboardMarkup(keyboard)
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles /search <text>: find transactions by description"""
+    query = " ".join(context.args)
+
+    if not search_terms(query):
+        await update.message.reply_text(
+            "🔍 Tell me what to look for, e.g. /search coffee")
+        return
+
+    logger.info("Search %r, User: %s", query, update.message.from_user.first_name)
+
+    text, reply_markup = await search_page(update.effective_chat.id, query)
+    await update.message.reply_text(
+        text=text, reply_markup=reply_markup, parse_mode='Markdown')
+
+
+async def search_page_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the page of results encoded in the button pressed"""
+    query = update.callback_query
+    await query.answer()
+
+    offset, search = query.data.removeprefix(PAGE_PREFIX).split(":", 1)
+    text, reply_markup = await search_page(
+        update.effective_chat.id, search, int(offset))
+    await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode='Markdown')
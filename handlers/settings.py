@@ -1,6 +1,6 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
-from utils.database import (
+from utils.async_database import (
     add_custom_category,
     get_categories_name,
     get_custom_categories_name_and_id,
@@ -9,6 +9,11 @@ from utils.database import (
     set_currency,
     delete_user_data,
 )
+from utils.keyboards import (
+    CATEGORY_TYPE_KEYBOARD,
+    RESET_CONFIRM_KEYBOARD,
+    SETTINGS_MENU_KEYBOARD,
+)
 from utils.misc import list_chunker
 
 import logging
@@ -28,26 +33,9 @@ CHOICE, ADD_CATEGORY, DATABASE_ACTION, VIEW_CATEGORIES, DELETE_CATEGORIES, SET_C
 
 
 async def start_settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                "➕ Add Category", callback_data="add_category"),
-            InlineKeyboardButton(
-                "👁️ View Categories", callback_data="view_categories"),
-            InlineKeyboardButton("🗑️ Delete Categories",
-                                 callback_data="delete_categories"),
-        ],
-        [
-            InlineKeyboardButton(
-                "💵 Set Currency", callback_data="set_currency"),
-            InlineKeyboardButton("🔄 Reset Data", callback_data="reset_data"),
-        ],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     await update.message.reply_text(
         "⚙️ Welcome to Settings! What would you like to do?",
-        reply_markup=reply_markup,
+        reply_markup=SETTINGS_MENU_KEYBOARD,
     )
 
     return CHOICE
@@ -57,15 +45,7 @@ async def categories_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     await query.answer()
     choice = query.data
-
-    keyboard = [
-        [
-            InlineKeyboardButton("💸 Expense", callback_data="expense"),
-            InlineKeyboardButton("💰 Income", callback_data="income"),
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="start_settings")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = CATEGORY_TYPE_KEYBOARD
 
     if choice == "add_category":
         await query.edit_message_text(
@@ -95,18 +75,9 @@ async def categories_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return SET_CURRENCY
 
     elif choice == "reset_data":
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Yes, reset my data",
-                                     callback_data="confirm_reset"),
-                InlineKeyboardButton(
-                    "❌ No, cancel", callback_data="cancel_reset"),
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(
             text="⚠️ Are you sure you want to reset all your data? This action cannot be undone.",
-            reply_markup=reply_markup
+            reply_markup=RESET_CONFIRM_KEYBOARD
         )
         return RESET_DATA_CONFIRM
 
@@ -139,7 +110,7 @@ async def delete_categories(update: Update, context: ContextTypes.DEFAULT_TYPE)
     type_of_transaction = query.data.lower()
     context.user_data['action'] = 'delete_category'
 
-    categories = get_custom_categories_name_and_id(
+    categories = await get_custom_categories_name_and_id(
         user_id, type_of_transaction)
 
     keyboard = [
@@ -166,14 +137,14 @@ async def database_action(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         category_name = update.message.text
         type_of_transaction = context.user_data.get('type_of_transaction')
 
-        if category_name in get_categories_name(type_of_transaction.lower(), user_id):
+        if category_name in await get_categories_name(type_of_transaction.lower(), user_id):
             await update.message.reply_text(
                 f"⛔️ Category '{category_name}' already exists for {type_of_transaction}. Please choose another name.",
             )
             return DATABASE_ACTION
 
         try:
-            add_custom_category(
+            await add_custom_category(
                 user_id=user_id,
                 name=category_name,
                 type_of_transaction=type_of_transaction.lower()
@@ -188,8 +159,8 @@ async def database_action(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         query = update.callback_query
         await query.answer()
         category_name = query.data
-        category_id = get_category_id(category_name)
-        delete_category(user_id, category_id)
+        category_id = await get_category_id(category_name, user_id)
+        await delete_category(user_id, category_id)
         await query.edit_message_text(
             text=f"⛔️ Category '{category_name}' has been successfully deleted!"
         )
@@ -201,7 +172,8 @@ async def view_categories(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer()
     choice = query.data
-    categories = get_categories_name(choice.lower())
+    user_id = update.effective_chat.id
+    categories = await get_categories_name(choice.lower(), user_id)
 
     message = f"📋 Here are your {choice.lower()} categories:\n\n"
     for category in categories:
@@ -224,7 +196,7 @@ async def set_currency_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return SET_CURRENCY
 
-    set_currency(user_id, currency_symbol)
+    await set_currency(user_id, currency_symbol)
 
     await update.message.reply_text(
         f"✅ Your currency has been set to {currency_symbol}."
@@ -239,7 +211,7 @@ async def reset_data_confirm_handler(update: Update, context: ContextTypes.DEFAU
     user_id = update.effective_chat.id
 
     if choice == 'confirm_reset':
-        delete_user_data(user_id)
+        await delete_user_data(user_id)
         await query.edit_message_text(
             text="🗑️ All your data has been successfully reset."
         )
@@ -259,17 +231,9 @@ async def back_settings_handler(update: Update, context: ContextTypes.DEFAULT_TY
     if query.data == "start_settings":
         return await start_settings(update, context)
     elif query.data == "back_to_delete_choice":
-        keyboard = [
-            [
-                InlineKeyboardButton("💸 Expense", callback_data="expense"),
-                InlineKeyboardButton("💰 Income", callback_data="income"),
-            ],
-            [InlineKeyboardButton("🔙 Back", callback_data="start_settings")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(
             text="🗑️ Which category would you like to delete?",
-            reply_markup=reply_markup
+            reply_markup=CATEGORY_TYPE_KEYBOARD
         )
         return DELETE_CATEGORIES
 
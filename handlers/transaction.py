@@ -1,8 +1,10 @@
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 
-from utils.database import get_category_id, get_currency, save_transaction, get_categories_name, get_category_type
-from utils.misc import is_valid_currency, list_chunker
+from utils.async_database import get_category_id, get_currency, get_category_type
+from utils.keyboards import TRANSACTION_TYPE_KEYBOARD, category_keyboard
+from utils.misc import is_valid_currency
+from utils.write_buffer import write_buffer
 
 import logging
 
@@ -17,13 +19,6 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
-# Set the categories for income and expense
-
-EXPENSE_CATEGORIES = list_chunker(
-    categories=get_categories_name("expense"), chunk_size=3)
-INCOME_CATEGORIES = list_chunker(
-    categories=get_categories_name("income"), chunk_size=3)
-
 # Conversation states
 TYPE, AMOUNT, DESCRIPTION, CATEGORY = range(4)
 
@@ -32,15 +27,9 @@ TYPE, AMOUNT, DESCRIPTION, CATEGORY = range(4)
 
 async def start_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the conversation and ask for transaction type."""
-    keyboard = [
-        [
-            InlineKeyboardButton("💸 Expense", callback_data="Expense"),
-            InlineKeyboardButton("💰 Income", callback_data="Income"),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
-        "What kind of transaction are we tracking today? 💰", reply_markup=reply_markup
+        "What kind of transaction are we tracking today? 💰",
+        reply_markup=TRANSACTION_TYPE_KEYBOARD
     )
     return TYPE
 
@@ -99,19 +88,12 @@ async def description_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     logger.info("Transaction description: %s, User: %s",
                 context.user_data['description'], user.first_name)
 
-    if context.user_data['type'] == "Income":
-        categories = INCOME_CATEGORIES
-    else:
-        categories = EXPENSE_CATEGORIES
-
-    keyboard = [
-        [InlineKeyboardButton(category, callback_data=category)
-         for category in row]
-        for row in categories
-    ]
-    keyboard.append([InlineKeyboardButton(
-        "⬅️ Back", callback_data="back_to_description")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Per-user keyboard, reused until the user's categories change
+    reply_markup = await category_keyboard(
+        update.effective_chat.id,
+        context.user_data['type'].lower(),
+        footer=(("⬅️ Back", "back_to_description"),)
+    )
 
     await update.message.reply_text(
         f"Great! Which category best describes this {context.user_data['type'].lower()}? 👇",
@@ -130,12 +112,14 @@ async def category_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
     # Store transaction category in temporary dictionary
     category_name = query.data
-    category_id = get_category_id(category_name)
-    category_type = get_category_type(category_id)
-    currency = get_currency(update.effective_chat.id)
-
-    # Save transaction to database
-    save_transaction(
+    category_id = await get_category_id(
+        category_name, update.effective_chat.id)
+    category_type = await get_category_type(
+        category_id, update.effective_chat.id)
+    currency = await get_currency(update.effective_chat.id)
+
+    # Save transaction to database, batched with others if the buffer is on
+    await write_buffer.save_transaction(
         user_id=update.effective_chat.id,
         type_of_transaction=context.user_data['type'].lower(),
         amount=float(context.user_data['amount']),
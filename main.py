@@ -3,8 +3,14 @@ from dotenv import load_dotenv
 import os
 import logging
 
+from utils import config
 from utils.database import init_db
-from utils.scheduler import start_scheduler
+from utils.async_database import shutdown_executor
+from utils.scheduler import schedule_recurring_transactions
+from utils.write_buffer import start_write_buffer, stop_write_buffer
+from utils.charts import shutdown_chart_pool
+from utils.update_processor import ChatOrderedUpdateProcessor, log_update_metrics
+from utils.persistence import DatabasePersistence, evict_idle_users, expire_restored_conversations
 from handlers.start import start_command
 from handlers.transaction import (
     start_transaction,
@@ -34,6 +40,7 @@ from handlers.history import (
     weekly_handler,
     monthly_handler,
     yearly_handler,
+    chart_handler,
     back_history_handler,
 )
 from handlers.settings import (
@@ -57,10 +64,29 @@ from handlers.budget import (
     cancel_budget,
     back_budget_handler,
 )
+from handlers.browse import (
+    browse_handler,
+    browse_category_handler,
+)
+from handlers.search import (
+    search_command,
+    search_page_handler,
+)
+from handlers.imports import (
+    start_import,
+    upload_handler,
+    cancel_import,
+)
+from handlers.export import (
+    start_export,
+    format_handler,
+    cancel_export,
+)
 
 
 from telegram.ext import (
     filters,
+    Application,
     ApplicationBuilder,
     CommandHandler,
     ConversationHandler,
@@ -86,7 +112,7 @@ RECURRING_TYPE, RECURRING_AMOUNT, RECURRING_DESCRIPTION, RECURRING_CATEGORY, REC
     7)
 
 # History states
-CHOICE, SUMMARY, WEEKLY, MONTHLY, YEARLY = range(5)
+CHOICE, SUMMARY, WEEKLY, MONTHLY, YEARLY, CHARTS = range(6)
 
 # Settings states
 CHOICE, ADD_CATEGORY, DATABASE_ACTION, VIEW_CATEGORIES, DELETE_CATEGORIES, SET_CURRENCY, RESET_DATA, RESET_DATA_CONFIRM = range(
@@ -96,13 +122,65 @@ CHOICE, ADD_CATEGORY, DATABASE_ACTION, VIEW_CATEGORIES, DELETE_CATEGORIES, SET_C
 CHOICE, MONTH_SELECTION, CATEGORY_SELECTION, AMOUNT_INPUT, CHANGE_CATEGORY, CHANGE_AMOUNT = range(
     6)
 
+# Import states
+UPLOAD = 0
 
-def main() -> None:
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+# Export states
+FORMAT = 0
+
+
+async def post_init(application) -> None:
+    await start_write_buffer(application)
+    # Restored conversations get no timeout from PTB until they are used
+    await expire_restored_conversations(application)
+
+
+async def post_shutdown(application) -> None:
+    # Buffered transactions are written through the database executor, so
+    # flush them before stopping it
+    await stop_write_buffer(application)
+    await shutdown_executor(application)
+    await shutdown_chart_pool(application)
+
+
+def build_application(builder: ApplicationBuilder = None) -> Application:
+    """
+    Build the bot with all of its handlers and jobs.
+
+    builder defaults to one using BOT_TOKEN; benchmarks pass their own to
+    swap in an offline connection to Telegram.
+    """
+    if builder is None:
+        builder = ApplicationBuilder().token(BOT_TOKEN)
+
+    application = (
+        builder
+        # Chats run in parallel, but each chat's updates run in order so its
+        # conversations see them one at a time
+        .concurrent_updates(ChatOrderedUpdateProcessor(
+            config.CONCURRENT_UPDATES, config.MAX_PENDING_UPDATES))
+        # Half-finished conversations and user_data survive restarts
+        .persistence(DatabasePersistence(
+            config.CONVERSATION_TIMEOUT, config.PERSISTENCE_UPDATE_INTERVAL))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Start the application
     application.add_handler(CommandHandler("start", start_command))
 
+    # The transaction browser keeps its state in callback_data, so it works
+    # from any message and ahead of whatever conversation the user is in
+    application.add_handler(CallbackQueryHandler(
+        browse_handler, pattern="^(br:|brx$)"))
+    application.add_handler(CallbackQueryHandler(
+        browse_category_handler, pattern="^brc:"))
+
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CallbackQueryHandler(
+        search_page_handler, pattern="^sr:"))
+
     transaction_handler = ConversationHandler(
         entry_points=[CommandHandler("transaction", start_transaction)],
         states={
@@ -121,6 +199,9 @@ def main() -> None:
         },
         fallbacks=[CommandHandler("cancel", cancel_transaction)],
         per_message=False,
+        name="transaction",
+        persistent=True,
+        conversation_timeout=config.CONVERSATION_TIMEOUT,
     )
 
     recurring_transaction_handler = ConversationHandler(
@@ -137,19 +218,49 @@ def main() -> None:
         },
         fallbacks=[CommandHandler("cancel", cancel_recurring_transaction)],
         per_message=False,
+        name="recurring",
+        persistent=True,
+        conversation_timeout=config.CONVERSATION_TIMEOUT,
     )
 
     history_handler = ConversationHandler(
         entry_points=[CommandHandler("history", start_history)],
         states={
             CHOICE: [CallbackQueryHandler(history_choice)],
-            SUMMARY: [CallbackQueryHandler(summary_handler)],
-            WEEKLY: [CallbackQueryHandler(weekly_handler)],
-            MONTHLY: [CallbackQueryHandler(monthly_handler)],
-            YEARLY: [CallbackQueryHandler(yearly_handler)],
+            SUMMARY: [
+                CallbackQueryHandler(
+                    back_history_handler, pattern="^start_history$"),
+                CallbackQueryHandler(summary_handler),
+            ],
+            WEEKLY: [
+                CallbackQueryHandler(summary_handler, pattern="^periods_"),
+                CallbackQueryHandler(
+                    back_history_handler, pattern="^back_to_summary$"),
+                CallbackQueryHandler(weekly_handler),
+            ],
+            MONTHLY: [
+                CallbackQueryHandler(summary_handler, pattern="^periods_"),
+                CallbackQueryHandler(
+                    back_history_handler, pattern="^back_to_summary$"),
+                CallbackQueryHandler(monthly_handler),
+            ],
+            YEARLY: [
+                CallbackQueryHandler(summary_handler, pattern="^periods_"),
+                CallbackQueryHandler(
+                    back_history_handler, pattern="^back_to_summary$"),
+                CallbackQueryHandler(yearly_handler),
+            ],
+            CHARTS: [
+                CallbackQueryHandler(chart_handler, pattern="^chart_"),
+                CallbackQueryHandler(
+                    back_history_handler, pattern="^start_history$"),
+            ],
         },
         fallbacks=[CommandHandler("cancel", cancel_history)],
         per_message=False,
+        name="history",
+        persistent=True,
+        conversation_timeout=config.CONVERSATION_TIMEOUT,
     )
 
     settings_handler = ConversationHandler(
@@ -182,6 +293,9 @@ def main() -> None:
         },
         fallbacks=[CommandHandler("cancel", cancel_settings)],
         per_message=False,
+        name="settings",
+        persistent=True,
+        conversation_timeout=config.CONVERSATION_TIMEOUT,
     )
 
     budget_handler = ConversationHandler(
@@ -194,6 +308,33 @@ def main() -> None:
         },
         fallbacks=[CommandHandler("cancel", cancel_budget)],
         per_message=False,
+        name="budget",
+        persistent=True,
+        conversation_timeout=config.CONVERSATION_TIMEOUT,
+    )
+
+    import_handler = ConversationHandler(
+        entry_points=[CommandHandler("import", start_import)],
+        states={
+            UPLOAD: [MessageHandler(filters.Document.ALL, upload_handler)],
+        },
+        fallbacks=[CommandHandler("cancel", cancel_import)],
+        per_message=False,
+        name="import",
+        persistent=True,
+        conversation_timeout=config.CONVERSATION_TIMEOUT,
+    )
+
+    export_handler = ConversationHandler(
+        entry_points=[CommandHandler("export", start_export)],
+        states={
+            FORMAT: [CallbackQueryHandler(format_handler, pattern="^export_")],
+        },
+        fallbacks=[CommandHandler("cancel", cancel_export)],
+        per_message=False,
+        name="export",
+        persistent=True,
+        conversation_timeout=config.CONVERSATION_TIMEOUT,
     )
 
     application.add_handler(transaction_handler)
@@ -201,11 +342,44 @@ def main() -> None:
     application.add_handler(history_handler)
     application.add_handler(settings_handler)
     application.add_handler(budget_handler)
+    application.add_handler(import_handler)
+    application.add_handler(export_handler)
+
+    schedule_recurring_transactions(application.job_queue)
+    if config.UPDATE_METRICS_INTERVAL:
+        application.job_queue.run_repeating(
+            log_update_metrics, interval=config.UPDATE_METRICS_INTERVAL,
+            name="update_metrics")
+    application.job_queue.run_repeating(
+        evict_idle_users, interval=config.CONVERSATION_TIMEOUT,
+        name="evict_idle_users")
+
+    return application
+
 
-    application.run_polling()
+def main() -> None:
+    application = build_application()
+
+    if config.BOT_MODE != "webhook":
+        application.run_polling()
+        return
+
+    if not config.WEBHOOK_URL:
+        raise SystemExit("WEBHOOK_URL must be set when BOT_MODE=webhook")
+
+    # On SIGINT/SIGTERM the server stops taking new updates first; the
+    # application then finishes every update it has already received
+    # before post_shutdown flushes the write buffer
+    application.run_webhook(
+        listen=config.WEBHOOK_LISTEN,
+        port=config.WEBHOOK_PORT,
+        url_path=config.WEBHOOK_PATH,
+        webhook_url=f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}",
+        secret_token=config.WEBHOOK_SECRET_TOKEN or None,
+        max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+    )
 
 
 if __name__ == "__main__":
     init_db()
-    start_scheduler()
     main()
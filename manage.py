@@ -0,0 +1,169 @@
+"""
+Maintenance commands for Expentrax.
+
+Usage:
+    python manage.py rebuild-totals [--user USER_ID] [--check]
+    python manage.py run-recurring [--workers N | --shard I --shards N]
+    python manage.py smoke-test
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from utils import database
+from utils.config import RECURRING_WORKERS
+from utils.database import init_db, rebuild_period_totals
+from utils.scheduler import check_recurring_transactions, run_sharded
+
+# Telegram never hands out negative user ids, so this can't clash with a user
+SMOKE_TEST_USER_ID = -4242424242
+
+
+def rebuild_totals(args) -> int:
+    mismatches = rebuild_period_totals(
+        user_id=args.user, check_only=args.check)
+
+    if args.check:
+        print(f"{mismatches} period total bucket(s) out of sync")
+        return 1 if mismatches else 0
+
+    print(f"Rebuilt period totals, {mismatches} bucket(s) were out of sync")
+    return 0
+
+
+def run_recurring(args) -> int:
+    if args.shards is not None:
+        # One shard per invocation, e.g. spread across several machines
+        posted = check_recurring_transactions(
+            shard=args.shard, shards=args.shards)
+    else:
+        posted = run_sharded(args.workers)
+
+    print(f"Posted {len(posted)} recurring transaction(s)")
+    return 0
+
+
+def smoke_test(args) -> int:
+    """
+    Exercise the data-access API against DATABASE_URL using a throwaway user,
+    then remove that user's rows again. Meant for scratch databases, e.g. one
+    started by scripts/with_temp_postgres.sh.
+    """
+    user_id = SMOKE_TEST_USER_ID
+    failures = []
+
+    def check(name, actual, expected):
+        status = "ok" if actual == expected else "FAIL"
+        print(f"{status:>4}  {name}: {actual!r}")
+        if actual != expected:
+            failures.append(name)
+
+    print(f"Backend: {database.engine.url.render_as_string(hide_password=True)}")
+    check("ensure_user registers once",
+          (database.ensure_user(user_id, None), database.ensure_user(user_id, None)),
+          (True, False))
+    database.add_custom_category(user_id, "Smoke Food", "expense")
+    database.add_custom_category(user_id, "Smoke Pay", "income")
+    food = database.get_category_id("Smoke Food", user_id)
+    pay = database.get_category_id("Smoke Pay", user_id)
+
+    database.save_transaction(user_id, "expense", 12.5, "lunch",
+                              datetime(2024, 12, 31, 23, 30), food, "expense")
+    database.save_transaction(user_id, "expense", 7.5, "dinner",
+                              datetime(2025, 1, 2, 19, 0), food, "expense")
+    database.save_transaction(user_id, "income", 100.0, "salary",
+                              datetime(2025, 1, 3, 9, 0), pay, "income")
+
+    january = database.get_period_total(user_id, "month", 2025, 1)
+    check("month total", (january.total_income, january.total_expense),
+          (100.0, 7.5))
+    week = database.get_period_total(user_id, "week", 2025, target_week=0)
+    check("week total", (week.total_income, week.total_expense), (100.0, 7.5))
+    check("periods", database.get_summary_periods(user_id, "monthly"),
+          ["Jan 2025", "Dec 2024"])
+    check("recent names",
+          [name for _, name in database.get_recent_transactions_with_category(user_id)],
+          ["Smoke Pay", "Smoke Food", "Smoke Food"])
+    check("search",
+          [row.description for row, _ in database.search_transactions(user_id, "LUN", 5)],
+          ["lunch"])
+
+    database.set_currency(user_id, "€")
+    cached = database.get_currency(user_id)
+    database.profile_cache.invalidate(user_id)
+    check("currency write-through", (cached, database.get_currency(user_id)),
+          ("€", "€"))
+
+    database.set_budget(user_id, 20.0, food, "expense", 1, 2025)
+    status = database.get_budget_status(user_id, 2025, 1)
+    check("budget status",
+          [(row.category_name, row.spent, row.total_remaining) for row in status],
+          [("Smoke Food", 7.5, 12.5)])
+
+    # Recurring occurrences are keyed by (recurring_id, timestamp)
+    database.save_recurring_transaction(user_id, "expense", 3.0, "coffee", food,
+                                        "expense", "daily", datetime(2999, 1, 1))
+    with Session(database.engine) as session:
+        rule_id = session.scalar(select(database.RecurringTransaction.id).where(
+            database.RecurringTransaction.user_id == user_id))
+        occurrence = dict(user_id=user_id, type_of_transaction="expense", amount=3.0,
+                          description="coffee", timestamp=datetime(2025, 1, 4),
+                          category_id=food, category_type="expense", recurring_id=rule_id)
+        first = database.insert_transactions(session, [occurrence])
+        again = database.insert_transactions(session, [occurrence])
+        session.commit()
+    check("recurring insert is idempotent", (len(first), len(again)), (1, 0))
+
+    check("period totals in sync",
+          rebuild_period_totals(user_id=user_id, check_only=True), 0)
+
+    database.delete_user_data(user_id)
+    with Session(database.engine) as session:
+        session.execute(delete(database.RecurringTransaction).where(
+            database.RecurringTransaction.user_id == user_id))
+        session.execute(delete(database.User).where(
+            database.User.id == user_id))
+        session.commit()
+    database.profile_cache.invalidate(user_id)
+
+    print("FAILED: " + ", ".join(failures) if failures else "All checks passed")
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-totals",
+        help="Recompute the period totals table from raw transactions")
+    rebuild.add_argument("--user", type=int,
+                         help="Only rebuild this user's totals")
+    rebuild.add_argument("--check", action="store_true",
+                         help="Report mismatches without changing anything")
+    rebuild.set_defaults(func=rebuild_totals)
+
+    recurring = commands.add_parser(
+        "run-recurring", help="Post due recurring transactions now")
+    recurring.add_argument("--workers", type=int, default=RECURRING_WORKERS,
+                           help="Worker processes, one per user_id shard")
+    recurring.add_argument("--shard", type=int, default=0,
+                           help="Only process this shard (with --shards)")
+    recurring.add_argument("--shards", type=int,
+                           help="Total number of shards across invocations")
+    recurring.set_defaults(func=run_recurring)
+
+    smoke = commands.add_parser(
+        "smoke-test", help="Check the data-access API against DATABASE_URL")
+    smoke.set_defaults(func=smoke_test)
+
+    args = parser.parse_args()
+    init_db()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
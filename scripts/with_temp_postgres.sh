@@ -0,0 +1,34 @@
+#!/usr/bin/env bash
+# Run a command against a throwaway PostgreSQL cluster.
+#
+# Usage:
+#     scripts/with_temp_postgres.sh python manage.py smoke-test
+#
+# Needs the PostgreSQL server binaries (initdb, pg_ctl, createdb) on PATH, or
+# their directory in PG_BIN. DATABASE_URL is exported for the command and the
+# cluster is removed again when it exits.
+set -euo pipefail
+
+if [ "$#" -eq 0 ]; then
+    echo "usage: $0 command [args...]" >&2
+    exit 2
+fi
+
+PG_BIN="${PG_BIN:-$(dirname "$(command -v initdb || echo /usr/bin/initdb)")}"
+PG_PORT="${PG_PORT:-54329}"
+PG_DB="${PG_DB:-expentrax}"
+PG_DATA="$(mktemp -d)"
+
+cleanup() {
+    "$PG_BIN/pg_ctl" -D "$PG_DATA" -m fast -w stop >/dev/null 2>&1 || true
+    rm -rf "$PG_DATA"
+}
+trap cleanup EXIT
+
+"$PG_BIN/initdb" -D "$PG_DATA" -U postgres -A trust -E UTF8 --no-locale >/dev/null
+"$PG_BIN/pg_ctl" -D "$PG_DATA" -l "$PG_DATA/server.log" -w \
+    -o "-p $PG_PORT -k $PG_DATA -c listen_addresses=localhost" start >/dev/null
+"$PG_BIN/createdb" -h localhost -p "$PG_PORT" -U postgres "$PG_DB"
+
+export DATABASE_URL="postgresql+psycopg://postgres@localhost:$PG_PORT/$PG_DB"
+"$@"
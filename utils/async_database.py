@@ -0,0 +1,94 @@
+"""
+Awaitable versions of the functions in utils.database.
+
+Every query in utils.database opens a blocking Session, so calling it straight
+from a handler stalls the event loop for every other chat. The wrappers here
+run the same functions on a bounded thread pool and can be awaited instead.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import database
+from utils.config import DB_MAX_WORKERS
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=DB_MAX_WORKERS, thread_name_prefix="db")
+
+
+async def run_sync(func, /, *args, **kwargs):
+    '''Run a blocking function on the database thread pool and await it'''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def _to_async(func):
+    '''Wrap a blocking database function so it can be awaited'''
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_sync(func, *args, **kwargs)
+
+    return wrapper
+
+
+async def shutdown_executor(application=None) -> None:
+    """Wait for queued database calls to finish and stop the worker threads."""
+    logger.info("Shutting down database executor")
+    _executor.shutdown(wait=True)
+
+
+# Users
+save_user = _to_async(database.save_user)
+ensure_user = _to_async(database.ensure_user)
+read_user = _to_async(database.read_user)
+set_currency = _to_async(database.set_currency)
+
+
+async def get_currency(user_id: int) -> str:
+    '''Awaitable get_currency that answers from the profile cache when it can'''
+    profile = database.profile_cache.cached(user_id)
+    if profile is not None:
+        return profile.currency
+    return await run_sync(database.get_currency, user_id)
+
+
+delete_user_data = _to_async(database.delete_user_data)
+
+# Transactions
+save_transaction = _to_async(database.save_transaction)
+save_transactions = _to_async(database.save_transactions)
+save_recurring_transaction = _to_async(database.save_recurring_transaction)
+get_recent_transactions = _to_async(database.get_recent_transactions)
+get_recent_transactions_with_category = _to_async(
+    database.get_recent_transactions_with_category)
+get_transactions_page = _to_async(database.get_transactions_page)
+search_transactions = _to_async(database.search_transactions)
+get_summary_periods = _to_async(database.get_summary_periods)
+get_period_total = _to_async(database.get_period_total)
+get_period_breakdown = _to_async(database.get_period_breakdown)
+get_monthly_totals = _to_async(database.get_monthly_totals)
+
+# Categories
+add_custom_category = _to_async(database.add_custom_category)
+get_category_id = _to_async(database.get_category_id)
+get_categories_name = _to_async(database.get_categories_name)
+get_category_type = _to_async(database.get_category_type)
+get_category_name_by_id = _to_async(database.get_category_name_by_id)
+get_custom_categories_name_and_id = _to_async(
+    database.get_custom_categories_name_and_id)
+delete_category = _to_async(database.delete_category)
+
+# Budgets
+set_budget = _to_async(database.set_budget)
+get_budget_by_month = _to_async(database.get_budget_by_month)
+get_spend_by_month = _to_async(database.get_spend_by_month)
+get_budget_status = _to_async(database.get_budget_status)
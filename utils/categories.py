@@ -0,0 +1,108 @@
+"""
+In-process registry of the categories each user can pick from.
+
+Default categories are loaded once; each user's custom categories are loaded
+on first use and kept in an LRU cache until that user's categories change,
+or until the cache's ttl runs out, which picks up changes made by another
+bot instance.
+The registry doesn't know about the database itself: utils.database passes in
+the loader functions and invalidates users whenever it writes categories.
+"""
+import itertools
+import threading
+from typing import NamedTuple, Optional
+
+from utils.cache import LRUCache
+
+
+class Category(NamedTuple):
+    id: int
+    name: str
+    type_of_transaction: str  # 'income' or 'expense'
+    source: str  # 'default' or 'custom'
+
+
+class CategorySet:
+    '''Read-only snapshot of the categories visible to one user'''
+
+    def __init__(self, categories, version: int):
+        self.version = version
+        self._by_name = {}
+        self._by_id = {}
+        names = {'income': [], 'expense': []}
+
+        # Defaults come first, so they win name and id clashes with custom
+        # categories, as the old table-by-table lookups did
+        for category in categories:
+            self._by_name.setdefault(category.name, category)
+            self._by_id.setdefault(category.id, category)
+            names.setdefault(category.type_of_transaction,
+                             []).append(category.name)
+
+        self._names = {type_: tuple(values) for type_, values in names.items()}
+        self.custom = tuple(c for c in categories if c.source == 'custom')
+
+    # Versions are unique per snapshot, so they identify it for memoization
+    def __hash__(self):
+        return hash(self.version)
+
+    def __eq__(self, other):
+        return isinstance(other, CategorySet) and other.version == self.version
+
+    def names(self, type_of_transaction: str) -> tuple:
+        return self._names.get(type_of_transaction, ())
+
+    def by_name(self, name: str) -> Optional[Category]:
+        return self._by_name.get(name)
+
+    def by_id(self, id: int) -> Optional[Category]:
+        return self._by_id.get(id)
+
+
+class CategoryRegistry:
+    '''Caches a CategorySet per user'''
+
+    def __init__(self, load_defaults, load_custom, maxsize: int = 1024, ttl: float = None):
+        # load_defaults() and load_custom(user_id) return rows of
+        # (id, name, type_of_transaction)
+        self._load_defaults = load_defaults
+        self._load_custom = load_custom
+        self._defaults = None
+        self._users = LRUCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a write is
+        # not cached
+        self._generation = 0
+        self._versions = itertools.count(1)
+
+    def get(self, user_id: int) -> CategorySet:
+        '''Get the categories for a user, loading them on a cache miss'''
+        categories = self._users.get(user_id)
+        if categories is not None:
+            return categories
+
+        generation = self._generation
+        defaults = self._defaults
+        if defaults is None:
+            defaults = tuple(Category(*row, 'default')
+                             for row in self._load_defaults())
+        custom = tuple(Category(*row, 'custom')
+                       for row in self._load_custom(user_id))
+        categories = CategorySet(defaults + custom, next(self._versions))
+
+        with self._lock:
+            if generation == self._generation:
+                self._defaults = defaults
+                self._users.set(user_id, categories)
+
+        return categories
+
+    def invalidate(self, user_id: int = None):
+        '''Forget a user's cached categories, or everything if no user is given'''
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._defaults = None
+                self._users.clear()
+            else:
+                self._users.pop(user_id)
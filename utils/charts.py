@@ -0,0 +1,170 @@
+"""
+Spending charts rendered in a process pool.
+
+Rendering with matplotlib is CPU-bound and would hold up every other chat,
+so PNGs are drawn in worker processes. Each chart is described by a small
+spec (kind, title, labels, series); the spec's content hash maps to the
+Telegram file_id of the photo once it has been uploaded, so a repeat view
+re-sends the file_id instead of rendering and uploading again.
+
+Workers are spawned, not forked, so they start without the bot's threads,
+event loop or open database connections. They still import the bot: spawn
+re-runs the parent's entry module (main.py) as __mp_main__, which loads the
+handlers and creates the database engine, though it opens no connections.
+This module keeps its own imports light so render_chart doesn't add to that.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from telegram.error import TelegramError
+
+from utils.cache import LRUCache
+from utils.config import CHART_WORKERS
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+# Bump when the rendering changes so cached file_ids aren't reused
+CHART_STYLE_VERSION = 1
+
+# Slices past this are folded into "Other" on pie charts
+PIE_SLICES = 7
+
+# Content hash -> Telegram file_id of the uploaded PNG
+file_id_cache = LRUCache(maxsize=2048)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def chart_spec(kind: str, title: str, labels, series: dict, currency: str = "") -> dict:
+    '''Describe a chart: kind is "pie", "bar" or "line"; series maps a name to values'''
+    return {
+        "kind": kind,
+        "title": title,
+        "labels": [str(label) for label in labels],
+        "series": {name: [round(float(value), 2) for value in values]
+                   for name, values in series.items()},
+        "currency": currency,
+    }
+
+
+def spec_hash(spec: dict) -> str:
+    '''Content hash of a chart spec, stable across processes and restarts'''
+    payload = json.dumps([CHART_STYLE_VERSION, spec],
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_chart(spec: dict) -> bytes:
+    '''Draw a chart spec as PNG bytes. Runs in a worker process.'''
+    # The Figure API keeps no global pyplot state, so no backend switching
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(7, 4.5), dpi=120, layout="constrained")
+    axes = figure.subplots()
+    labels, series = spec["labels"], spec["series"]
+    unit = f" ({spec['currency']})" if spec["currency"] else ""
+
+    if spec["kind"] == "pie":
+        values = next(iter(series.values()))
+        if len(values) > PIE_SLICES:
+            # Keep the largest slices and fold the tail into one
+            ranked = sorted(zip(values, labels), reverse=True)
+            head, tail = ranked[:PIE_SLICES - 1], ranked[PIE_SLICES - 1:]
+            values = [value for value, _ in head] + [sum(value for value, _ in tail)]
+            labels = [label for _, label in head] + ["Other"]
+        axes.pie(values, labels=labels, autopct="%1.0f%%", startangle=90,
+                 counterclock=False, wedgeprops={"linewidth": 1, "edgecolor": "white"})
+        axes.axis("equal")
+
+    elif spec["kind"] == "bar":
+        values = next(iter(series.values()))
+        positions = range(len(labels))
+        axes.barh(positions, values, color="#d9534f")
+        axes.set_yticks(positions, labels)
+        axes.invert_yaxis()
+        axes.set_xlabel(f"Amount{unit}")
+        for position, value in zip(positions, values):
+            axes.annotate(f"{value:,.2f}", (value, position), xytext=(3, 0),
+                          textcoords="offset points", va="center", fontsize=8)
+
+    elif spec["kind"] == "line":
+        colors = {"Income": "#5cb85c", "Expense": "#d9534f"}
+        for name, values in series.items():
+            axes.plot(labels, values, marker="o", label=name, color=colors.get(name))
+        axes.set_ylabel(f"Amount{unit}")
+        axes.grid(axis="y", alpha=0.3)
+        axes.legend()
+        axes.tick_params(axis="x", labelrotation=45)
+
+    else:
+        raise ValueError(f"Unknown chart kind: {spec['kind']}")
+
+    axes.set_title(spec["title"])
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: workers inherit none of the bot's threads or
+            # connections, but do re-import main.py as __mp_main__
+            _pool = ProcessPoolExecutor(
+                max_workers=CHART_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+async def render(spec: dict) -> bytes:
+    '''Render a chart spec in the process pool'''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), render_chart, spec)
+
+
+async def send_chart(bot, chat_id: int, spec: dict, caption: str = None):
+    """
+    Send a chart as a photo, reusing the uploaded file_id if the same chart
+    was sent before, and rendering it in the process pool otherwise.
+    """
+    key = spec_hash(spec)
+    file_id = file_id_cache.get(key)
+
+    if file_id is not None:
+        try:
+            return await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+        except TelegramError as error:
+            # e.g. Telegram no longer knows the file; render it again
+            logger.warning("Cached chart %s could not be resent: %s", key[:12], error)
+            file_id_cache.pop(key)
+
+    png = await render(spec)
+    message = await bot.send_photo(chat_id=chat_id, photo=png, caption=caption)
+    # The largest size is the original upload
+    file_id_cache.set(key, message.photo[-1].file_id)
+    return message
+
+
+async def shutdown_chart_pool(application=None) -> None:
+    """Stop the chart worker processes."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        logger.info("Shutting down chart workers")
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,78 @@
+import os
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file before anything reads them
+load_dotenv()
+
+# Worker threads used to run blocking database calls off the event loop
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "4"))
+
+# Worker processes that render charts
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+
+# Write-behind buffer for new transactions. When enabled, transactions are
+# grouped into one commit every WRITE_BUFFER_MAX_DELAY_MS or
+# WRITE_BUFFER_MAX_ROWS rows. WRITE_BUFFER_ACK=commit makes handlers wait for
+# that commit; enqueue replies straight away and may lose the pending batch
+# if the process dies before it is written.
+WRITE_BUFFER_ENABLED = os.getenv("WRITE_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+WRITE_BUFFER_MAX_ROWS = int(os.getenv("WRITE_BUFFER_MAX_ROWS", "100"))
+WRITE_BUFFER_MAX_DELAY_MS = int(os.getenv("WRITE_BUFFER_MAX_DELAY_MS", "50"))
+WRITE_BUFFER_ACK = os.getenv("WRITE_BUFFER_ACK", "commit").lower()
+
+# Worker processes for the recurring job; each takes a user_id % N shard
+RECURRING_WORKERS = int(os.getenv("RECURRING_WORKERS", "1"))
+
+# Database
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///data/expentrax.db")
+# Pooled connections: one per executor thread plus the scheduler and a spare
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(DB_MAX_WORKERS + 2)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "4"))
+
+# SQLite pragmas applied to every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# User profiles (currency and other settings) kept in memory: at most
+# PROFILE_CACHE_SIZE users, each reloaded after PROFILE_CACHE_TTL seconds so
+# changes made by another process show up
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "4096"))
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "600"))
+# Seconds a user's cached categories (and so their category keyboards) are
+# used before being re-read, so categories added on another instance show up
+CATEGORY_CACHE_TTL = int(os.getenv("CATEGORY_CACHE_TTL", "300"))
+# Seconds a cached weekly/monthly/yearly breakdown is served before it is
+# recomputed, so transactions written by another process show up
+PERIOD_SUMMARY_CACHE_TTL = int(os.getenv("PERIOD_SUMMARY_CACHE_TTL", "60"))
+
+# How updates reach the bot: "polling" asks Telegram with getUpdates;
+# "webhook" serves WEBHOOK_URL and has Telegram push updates to it
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Public HTTPS base URL that Telegram posts to; WEBHOOK_PATH is appended
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+# Where the webhook server listens; TLS is expected to end at a proxy in front
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+# Sent back by Telegram in a header so forged requests are rejected
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+# Parallel HTTPS connections Telegram may open to deliver updates (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Updates handled at the same time, each chat's still one at a time and in
+# order. 1 handles them strictly one by one.
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "16"))
+# Updates taken off the queue at once, running or waiting behind their chat
+MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", "256"))
+# Seconds between update queue metrics in the log; 0 turns them off
+UPDATE_METRICS_INTERVAL = int(os.getenv("UPDATE_METRICS_INTERVAL", "60"))
+
+# Seconds of inactivity after which a half-finished conversation is ended
+# and the user's user_data is dropped from memory
+CONVERSATION_TIMEOUT = int(os.getenv("CONVERSATION_TIMEOUT", "1800"))
+# Seconds between writes of changed conversation state and user_data
+PERSISTENCE_UPDATE_INTERVAL = int(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "10"))
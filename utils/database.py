@@ -1,8 +1,19 @@
-from datetime import datetime
+import os
+import re
+from collections import Counter
+from datetime import datetime, timedelta
 from typing import List, Optional
-from sqlalchemy import create_engine, String, Float, Integer, DateTime, Text, select, delete, update, ForeignKey, func, case, extract, and_
+from sqlalchemy import create_engine, String, Float, Integer, BigInteger, DateTime, Text, Index, select, insert, delete, update, ForeignKey, func, case, and_, inspect, text, literal_column, event, tuple_
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import DeclarativeBase, Session, mapped_column, Mapped, relationship
 
+from utils import config
+from utils.categories import CategoryRegistry
+from utils.misc import next_occurrence
+from utils.profiles import ProfileCache, UserProfile
+from utils.summaries import PeriodSummaryCache, build_breakdown
+
 # Uncomment to enable SQLAlchemy logging
 # import logging
 # logging.basicConfig()
@@ -19,20 +30,78 @@ logger = logging.getLogger(__name__)
 
 
 # Setup
-engine = create_engine("sqlite:///data/expentrax.db")
+
+
+def create_db_engine(url: str = config.DATABASE_URL):
+    """
+    Create an engine for the configured database: SQLite by default, or
+    PostgreSQL with a postgresql+psycopg:// URL.
+
+    The connection pool is sized for the database executor threads plus the
+    scheduler. SQLite connections are switched to WAL with a busy timeout so
+    readers don't queue behind writers.
+    """
+    url = make_url(url)
+    in_memory = url.get_backend_name() == "sqlite" and url.database in (
+        None, "", ":memory:")
+
+    if in_memory:
+        return create_engine(url)
+
+    connect_args = {}
+    if url.get_backend_name() == "sqlite":
+        os.makedirs(os.path.dirname(url.database) or ".", exist_ok=True)
+    elif url.get_backend_name() == "postgresql":
+        # Timestamps are stored without a zone; pin the session to UTC so
+        # aware datetimes (Telegram message dates) keep their UTC wall clock,
+        # as they do in SQLite
+        connect_args["options"] = "-c timezone=utc"
+
+    engine = create_engine(
+        url,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        # Server connections can be dropped while idle in the pool
+        pool_pre_ping=url.get_backend_name() != "sqlite",
+        connect_args=connect_args
+    )
+
+    if url.get_backend_name() == "sqlite":
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(
+                f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+            cursor.execute(
+                f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+            # Negative cache_size is in KiB rather than pages
+            cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+            cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+            cursor.close()
+
+    return engine
+
+
+engine = create_db_engine()
 
 
 class Base(DeclarativeBase):
     pass
 
+
 # User table
 
+# Currency of users who haven't picked one in /settings
+DEFAULT_CURRENCY = 'RM'
+
 
 class User(Base):
     __tablename__ = 'users'
-    id: Mapped[int] = mapped_column(primary_key=True)
+    # Telegram ids need 64 bits; SQLite's INTEGER already is, Postgres' isn't
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     username: Mapped[Optional[str]] = mapped_column(String, unique=True)
-    currency: Mapped[Optional[str]] = mapped_column(String(5), default='RM')
+    currency: Mapped[Optional[str]] = mapped_column(String(5), default=DEFAULT_CURRENCY)
 
     transactions: Mapped[List["Transaction"]] = relationship(
         back_populates="user",
@@ -64,7 +133,7 @@ class User(Base):
 class Transaction(Base):
     __tablename__ = 'transactions'
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"))
     type_of_transaction: Mapped[str] = mapped_column(String(10))
     amount: Mapped[float] = mapped_column(Float)
     description: Mapped[str] = mapped_column(Text)
@@ -74,12 +143,33 @@ class Transaction(Base):
     category_id: Mapped[int] = mapped_column()
     # Specifies which table to look in: 'default' or 'custom'
     category_type: Mapped[str] = mapped_column(String(10))
+    # Set when posted by the recurring scheduler
+    recurring_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("recurring_transactions.id"))
 
     user: Mapped["User"] = relationship(back_populates="transactions")
 
+    __table_args__ = (
+        # Period summaries and recent history scan one user's rows by date
+        Index("ix_transactions_user_timestamp", "user_id", "timestamp"),
+        # Each recurring occurrence is posted at most once
+        Index("ux_transactions_recurring_occurrence",
+              "recurring_id", "timestamp", unique=True),
+    )
+
     def __repr__(self):
         return f"Transaction(id={self.id}, user_id={self.user_id})"
 
+
+# Full-text search over descriptions. PostgreSQL searches this expression
+# through a GIN index; SQLite uses the transactions_fts table created in
+# init_db(). The 'simple' configuration doesn't stem or drop stop words,
+# like the FTS5 tokenizer.
+_description_tsvector = func.to_tsvector(
+    text("'simple'"), Transaction.description)
+Index("ix_transactions_description_search", _description_tsvector,
+      postgresql_using="gin").ddl_if(dialect="postgresql")
+
 # Default categories
 
 
@@ -101,7 +191,7 @@ class CustomCategory(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50))
     type_of_transaction: Mapped[str] = mapped_column(String(10))
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"))
 
     user: Mapped["User"] = relationship(back_populates="custom_categories")
 
@@ -114,7 +204,7 @@ class CustomCategory(Base):
 class Budget(Base):
     __tablename__ = 'budget'
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"))
     budgeted_amount: Mapped[float] = mapped_column(Float)
     year: Mapped[int] = mapped_column(Integer)
     month: Mapped[int] = mapped_column(Integer)
@@ -123,6 +213,11 @@ class Budget(Base):
 
     user: Mapped["User"] = relationship(back_populates="budget")
 
+    __table_args__ = (
+        Index("ix_budget_user_period_category",
+              "user_id", "year", "month", "category_id"),
+    )
+
     def __repr__(self):
         return f"Budget(id={self.id}, user_id={self.user_id})"
 
@@ -130,7 +225,7 @@ class Budget(Base):
 class RecurringTransaction(Base):
     __tablename__ = 'recurring_transactions'
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"))
     type_of_transaction: Mapped[str] = mapped_column(String(10))
     amount: Mapped[float] = mapped_column(Float)
     description: Mapped[str] = mapped_column(Text)
@@ -139,16 +234,81 @@ class RecurringTransaction(Base):
     frequency: Mapped[str] = mapped_column(String(10))
     start_date: Mapped[datetime] = mapped_column(DateTime)
     end_date: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    # Next occurrence to post, or None once past end_date
+    next_run_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_run_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    # Set while a scheduler worker is posting this rule's occurrences
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(64))
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
 
     user: Mapped["User"] = relationship(
         back_populates="recurring_transactions")
 
+    __table_args__ = (
+        Index("ix_recurring_transactions_user_id", "user_id"),
+        Index("ix_recurring_transactions_start_date", "start_date"),
+        # The scheduler only ever reads rules that are due
+        Index("ix_recurring_transactions_next_run_at", "next_run_at"),
+    )
+
     def __repr__(self):
         return f"RecurringTransaction(id={self.id}, user_id={self.user_id})"
 
 
-# Create tables
-Base.metadata.create_all(engine)
+# Period totals
+
+
+class PeriodTotal(Base):
+    """
+    Running income/expense totals per user, week, category and type, kept in
+    step with transactions so summaries don't re-aggregate raw rows.
+
+    A %U week can straddle two months, so each bucket is keyed by year, month
+    and week together: month totals sum the weeks of that month, week totals
+    sum both halves of a straddling week.
+    """
+    __tablename__ = 'period_totals'
+    user_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey("users.id"), primary_key=True)
+    year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    month: Mapped[int] = mapped_column(Integer, primary_key=True)
+    week: Mapped[int] = mapped_column(Integer, primary_key=True)
+    category_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    category_type: Mapped[str] = mapped_column(String(10), primary_key=True)
+    type_of_transaction: Mapped[str] = mapped_column(
+        String(10), primary_key=True)
+    total: Mapped[float] = mapped_column(Float, default=0)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self):
+        return f"PeriodTotal(user_id={self.user_id}, year={self.year}, month={self.month}, week={self.week})"
+
+# Bot state kept across restarts (see utils/persistence.py)
+
+
+class ConversationState(Base):
+    """The state each persistent ConversationHandler has reached, per key."""
+    __tablename__ = 'conversation_states'
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    # The handler's (chat id, user id) key as a JSON list
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    state: Mapped[str] = mapped_column(Text)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+
+    def __repr__(self):
+        return f"ConversationState(name={self.name}, key={self.key})"
+
+
+class UserState(Base):
+    """One key of a user's context.user_data, JSON encoded."""
+    __tablename__ = 'user_states'
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    value: Mapped[str] = mapped_column(Text)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+
+    def __repr__(self):
+        return f"UserState(user_id={self.user_id}, key={self.key})"
 
 
 def save_user(id, username):
@@ -160,7 +320,27 @@ def save_user(id, username):
         session.add(user)
         session.commit()
 
-    logger.info("User saved to database: %s", user.username)
+    logger.info("User saved to database: %s", username)
+
+
+def ensure_user(id: int, username: Optional[str]) -> bool:
+    '''Register a user in one statement unless they exist; True if they were new'''
+    stmt = (
+        _dialect_insert(User)
+        .values(id=id, username=username)
+        .on_conflict_do_nothing(index_elements=[User.id])
+        .returning(User.currency, User.username)
+    )
+    with Session(engine) as session:
+        created = session.execute(stmt).one_or_none()
+        session.commit()
+
+    if created is None:
+        return False
+
+    profile_cache.set(id, UserProfile(*created))
+    logger.info("User saved to database: %s", username)
+    return True
 
 
 def save_transaction(
@@ -173,7 +353,7 @@ def save_transaction(
     category_type: str
 ):
 
-    transaction = Transaction(
+    values = dict(
         user_id=user_id,
         type_of_transaction=type_of_transaction,
         amount=amount,
@@ -184,9 +364,230 @@ def save_transaction(
     )
 
     with Session(engine) as session:
-        session.add(transaction)
+        session.add(Transaction(**values))
+        add_to_period_totals(session, [values])
+        session.commit()
+
+    invalidate_period_summaries([values])
+
+
+def save_transactions(rows) -> int:
+    """
+    Save several transactions in a single commit. Each row is a mapping of
+    save_transaction's arguments. Returns the number of rows inserted.
+    """
+    with Session(engine) as session:
+        inserted = insert_transactions(session, rows)
         session.commit()
 
+    invalidate_period_summaries(inserted)
+    return len(inserted)
+
+
+def get_max_transaction_id() -> int:
+    '''Highest transaction id so far, or 0 if there are none'''
+    with Session(engine) as session:
+        return session.scalar(select(func.max(Transaction.id))) or 0
+
+
+def count_matching_transactions(user_id: int, start: datetime, end: datetime, max_id: int = None) -> Counter:
+    """
+    Count a user's transactions between start and end (both inclusive) by
+    (type_of_transaction, amount, description, timestamp). If max_id is given,
+    only transactions up to that id are counted. Used to spot rows that were
+    already imported.
+    """
+    stmt = select(
+        Transaction.type_of_transaction,
+        Transaction.amount,
+        Transaction.description,
+        Transaction.timestamp,
+    ).where(
+        Transaction.user_id == user_id,
+        Transaction.timestamp >= start,
+        Transaction.timestamp <= end,
+    )
+    if max_id is not None:
+        stmt = stmt.where(Transaction.id <= max_id)
+
+    with Session(engine) as session:
+        return Counter(
+            (type_, round(amount, 2), description, timestamp)
+            for type_, amount, description, timestamp in session.execute(stmt)
+        )
+
+
+def get_description_categories(user_id: int) -> dict:
+    """
+    Map (type_of_transaction, lowercased description) to the (category_id,
+    category_type) the user most recently filed that description under.
+    """
+    stmt = select(
+        Transaction.type_of_transaction,
+        Transaction.description,
+        Transaction.category_id,
+        Transaction.category_type,
+    ).where(
+        Transaction.user_id == user_id
+    ).group_by(
+        Transaction.type_of_transaction,
+        Transaction.description,
+        Transaction.category_id,
+        Transaction.category_type,
+    ).order_by(func.max(Transaction.timestamp))
+
+    with Session(engine) as session:
+        # Oldest first, so the most recent category wins
+        return {
+            (type_, description.lower()): (category_id, category_type)
+            for type_, description, category_id, category_type in session.execute(stmt)
+        }
+
+
+def _dialect_insert(table):
+    '''INSERT construct with ON CONFLICT support for the engine's dialect'''
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def period_keys(timestamp: datetime):
+    '''Get the (year, month, week) bucket a timestamp falls in'''
+    return timestamp.year, timestamp.month, int(timestamp.strftime('%U'))
+
+
+_PERIOD_TOTAL_KEY = ("user_id", "year", "month", "week",
+                     "category_id", "category_type", "type_of_transaction")
+
+
+def _bucket_transactions(rows, buckets=None):
+    '''Sum transaction rows (mappings) into {period total key: [total, count]}'''
+    buckets = {} if buckets is None else buckets
+    for row in rows:
+        key = (row["user_id"], *period_keys(row["timestamp"]), row["category_id"],
+               row["category_type"], row["type_of_transaction"])
+        bucket = buckets.setdefault(key, [0.0, 0])
+        bucket[0] += row["amount"]
+        bucket[1] += 1
+    return buckets
+
+
+def add_to_period_totals(session: Session, rows):
+    """
+    Fold newly inserted transactions into period_totals.
+
+    Runs in the caller's session so the totals commit (or roll back) together
+    with the transactions themselves. Each row is a mapping with the
+    Transaction column names.
+    """
+    buckets = _bucket_transactions(rows)
+    if not buckets:
+        return
+
+    stmt = _dialect_insert(PeriodTotal)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(_PERIOD_TOTAL_KEY),
+        set_={
+            "total": PeriodTotal.total + stmt.excluded.total,
+            "count": PeriodTotal.count + stmt.excluded.count,
+        }
+    )
+    session.execute(stmt, [
+        dict(zip(_PERIOD_TOTAL_KEY, key), total=total, count=count)
+        for key, (total, count) in buckets.items()
+    ])
+
+
+def insert_transactions(session: Session, rows) -> list:
+    """
+    Bulk insert transaction rows (mappings of Transaction columns) in the
+    caller's session and fold them into period_totals.
+
+    Rows that would break a unique key, i.e. a recurring occurrence that is
+    already posted, are skipped. Returns the rows actually inserted.
+    """
+    if not rows:
+        return []
+
+    stmt = (
+        _dialect_insert(Transaction)
+        .on_conflict_do_nothing()
+        .returning(
+            Transaction.id,
+            Transaction.user_id,
+            Transaction.type_of_transaction,
+            Transaction.amount,
+            Transaction.description,
+            Transaction.timestamp,
+            Transaction.category_id,
+            Transaction.category_type,
+            Transaction.recurring_id
+        )
+    )
+    inserted = [dict(row)
+                for row in session.execute(stmt, list(rows)).mappings()]
+    add_to_period_totals(session, inserted)
+    return inserted
+
+
+def rebuild_period_totals(user_id: int = None, check_only: bool = False) -> int:
+    """
+    Recompute period_totals from the raw transactions.
+
+    Returns the number of buckets that were missing or wrong. Unless
+    check_only is set, the stored totals are then replaced with the
+    recomputed ones.
+    """
+    transactions_stmt = select(
+        Transaction.user_id,
+        Transaction.timestamp,
+        Transaction.category_id,
+        Transaction.category_type,
+        Transaction.type_of_transaction,
+        Transaction.amount
+    )
+    totals_stmt = select(PeriodTotal)
+    delete_stmt = delete(PeriodTotal)
+    if user_id is not None:
+        transactions_stmt = transactions_stmt.where(
+            Transaction.user_id == user_id)
+        totals_stmt = totals_stmt.where(PeriodTotal.user_id == user_id)
+        delete_stmt = delete_stmt.where(PeriodTotal.user_id == user_id)
+
+    with Session(engine) as session:
+        # Stream the raw rows; only the per-bucket sums are kept in memory
+        expected = {}
+        result = session.execute(
+            transactions_stmt.execution_options(yield_per=1000))
+        for partition in result.mappings().partitions():
+            _bucket_transactions(partition, expected)
+
+        stored = {
+            tuple(getattr(row, column) for column in _PERIOD_TOTAL_KEY): [row.total, row.count]
+            for row in session.execute(totals_stmt).scalars()
+        }
+
+        mismatches = sum(
+            1 for key in expected.keys() | stored.keys()
+            if key not in expected or key not in stored
+            or expected[key][1] != stored[key][1]
+            or abs(expected[key][0] - stored[key][0]) > 0.005
+        )
+
+        if check_only:
+            return mismatches
+
+        session.execute(delete_stmt)
+        if expected:
+            session.execute(insert(PeriodTotal), [
+                dict(zip(_PERIOD_TOTAL_KEY, key), total=total, count=count)
+                for key, (total, count) in expected.items()
+            ])
+        session.commit()
+
+    logger.info("Rebuilt period totals (%s mismatched buckets)", mismatches)
+    return mismatches
+
 
 def save_recurring_transaction(
     user_id: int,
@@ -208,7 +609,8 @@ def save_recurring_transaction(
         category_type=category_type,
         frequency=frequency,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        next_run_at=start_date
     )
 
     with Session(engine) as session:
@@ -225,6 +627,23 @@ def read_user(id: int):
         return user
 
 
+def _with_category_name(stmt, entity):
+    """
+    Outer join the category tables onto a statement selecting from entity
+    (anything with user_id and category_id) and add a category_name column.
+    Default categories win id clashes, as in get_category_name_by_id.
+    """
+    return (
+        stmt.add_columns(
+            func.coalesce(DefaultCategory.name, CustomCategory.name).label("category_name"))
+        .outerjoin(DefaultCategory, DefaultCategory.id == entity.category_id)
+        .outerjoin(CustomCategory, and_(
+            CustomCategory.id == entity.category_id,
+            CustomCategory.user_id == entity.user_id
+        ))
+    )
+
+
 def get_recent_transactions(user_id: int, limit=3):
 
     stmt = (
@@ -239,22 +658,245 @@ def get_recent_transactions(user_id: int, limit=3):
         return transactions
 
 
-def get_summary_periods(user_id: int, period: str):
+def get_recent_transactions_with_category(user_id: int, limit=3):
+    '''Get recent (transaction, category_name) rows in a single query'''
+
+    stmt = _with_category_name(
+        select(Transaction)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.timestamp.desc())
+        .limit(limit),
+        Transaction
+    )
+
+    with Session(engine) as session:
+        return session.execute(stmt).all()
+
+
+def get_transactions_page(
+    user_id: int,
+    limit: int,
+    older_than: tuple = None,
+    newer_than: tuple = None,
+    type_of_transaction: str = None,
+    category_id: int = None,
+    start: datetime = None,
+    end: datetime = None
+):
+    """
+    Get one page of (transaction, category_name) rows, newest first.
+
+    Pages are keyed on (timestamp, id) rather than OFFSET: older_than or
+    newer_than is the (timestamp, id) of the last or first row of the page
+    the user is coming from. Either way the query seeks straight to the
+    page through the (user_id, timestamp) index, so page 500 costs the same
+    as page 1. Optional filters narrow by type, category and a half-open
+    [start, end) date range.
+
+    Up to limit + 1 rows are returned, so callers can tell whether there is
+    another page in the direction they moved.
+    """
+    stmt = select(Transaction).where(Transaction.user_id == user_id)
+
+    if type_of_transaction:
+        stmt = stmt.where(
+            Transaction.type_of_transaction == type_of_transaction)
+    if category_id is not None:
+        stmt = stmt.where(Transaction.category_id == category_id)
+    if start is not None:
+        stmt = stmt.where(Transaction.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(Transaction.timestamp < end)
+
+    key = tuple_(Transaction.timestamp, Transaction.id)
+    if newer_than is not None:
+        # Walk forwards from the cursor, then flip back to newest first
+        stmt = stmt.where(key > tuple_(*newer_than)).order_by(
+            Transaction.timestamp, Transaction.id)
+    else:
+        if older_than is not None:
+            stmt = stmt.where(key < tuple_(*older_than))
+        stmt = stmt.order_by(Transaction.timestamp.desc(),
+                             Transaction.id.desc())
+
+    stmt = _with_category_name(stmt.limit(limit + 1), Transaction)
+
+    with Session(engine) as session:
+        rows = session.execute(stmt).all()
+
+    if newer_than is not None:
+        # Keep the limit + 1 row as the "more" marker at the end
+        page, extra = rows[:limit], rows[limit:]
+        return list(reversed(page)) + extra
+    return rows
+
+
+def search_terms(query: str) -> List[str]:
+    '''Split a search query into lower-cased words, dropping punctuation'''
+    return re.findall(r"\w+", query.lower())
+
+
+def search_transactions(user_id: int, query: str, limit: int, offset: int = 0):
+    """
+    Find a user's transactions whose description contains every word of
+    query, each matched as a prefix ("groc" finds "Groceries").
+
+    Rows are (transaction, category_name), best match first and most
+    recently added first among equals. The lookup goes through the full-text
+    index, so it doesn't scan the user's history. Up to limit + 1 rows are
+    returned, so callers can tell whether there is another page.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    if engine.dialect.name == "postgresql":
+        tsquery = func.to_tsquery(
+            text("'simple'"), " & ".join(f"{term}:*" for term in terms))
+        stmt = (
+            select(Transaction)
+            .where(Transaction.user_id == user_id,
+                   _description_tsvector.op("@@")(tsquery))
+            .order_by(func.ts_rank(_description_tsvector, tsquery).desc(),
+                      Transaction.id.desc())
+            .limit(limit + 1)
+            .offset(offset)
+        )
+    else:
+        # Terms are quoted so FTS5 reads them as words, never as operators.
+        # The user_key column keeps the match to this user's rows; bm25()
+        # ranks on the description alone. Ranking and paging happen inside
+        # the FTS query so only the page's rows are joined to transactions.
+        match = "user_key:{} AND description:({})".format(
+            _fts_user_key(user_id), " ".join(f'"{term}"*' for term in terms))
+        rank = literal_column("bm25(transactions_fts, 1.0, 0.0)")
+        rowid = literal_column("rowid")
+        matches = (
+            select(rowid.label("id"), rank.label("rank"))
+            .select_from(text("transactions_fts"))
+            .where(text("transactions_fts MATCH :match").bindparams(match=match))
+            .order_by(rank, rowid.desc())
+            .limit(limit + 1)
+            .offset(offset)
+            .subquery()
+        )
+        stmt = (
+            select(Transaction)
+            .join(matches, matches.c.id == Transaction.id)
+            .order_by(matches.c.rank, Transaction.id.desc())
+        )
 
-    stmt = select(Transaction.timestamp).distinct().where(
-        Transaction.user_id == user_id)
+    stmt = _with_category_name(stmt, Transaction)
 
     with Session(engine) as session:
-        distinct_timestamp = session.execute(stmt).scalars().all()
+        return session.execute(stmt).all()
 
-        if period == "yearly":
-            return sorted({d.strftime('%Y') for d in distinct_timestamp}, reverse=True)
 
-        elif period == "monthly":
-            return sorted({d.strftime('%b %Y') for d in distinct_timestamp}, reverse=True)
+def iter_transactions_with_category(user_id: int, batch_size: int = 1000):
+    """
+    Yield all of a user's transactions, oldest first, as rows of (id,
+    timestamp, type_of_transaction, amount, category_name, description).
 
-        elif period == "weekly":
-            return sorted({d.strftime('Week %U %Y') for d in distinct_timestamp}, reverse=True)
+    Rows are streamed from a server-side cursor batch_size at a time, so the
+    whole history is never held in memory. The session stays open until the
+    generator is exhausted or closed.
+    """
+    stmt = _with_category_name(
+        select(
+            Transaction.id,
+            Transaction.timestamp,
+            Transaction.type_of_transaction,
+            Transaction.amount,
+        )
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.timestamp, Transaction.id),
+        Transaction
+    ).add_columns(Transaction.description)
+
+    with Session(engine) as session:
+        result = session.execute(
+            stmt, execution_options={"yield_per": batch_size})
+        for partition in result.partitions():
+            yield from partition
+
+
+def get_summary_periods(user_id: int, period: str, limit: int = None, offset: int = 0):
+    """
+    Get the labels of the periods a user has transactions in, newest first.
+
+    The distinct periods come straight from the period_totals buckets, so only
+    one row per period is read. Use limit and offset to page through them.
+    """
+    if period == "yearly":
+        columns = [PeriodTotal.year]
+    elif period == "monthly":
+        columns = [PeriodTotal.year, PeriodTotal.month]
+    elif period == "weekly":
+        columns = [PeriodTotal.year, PeriodTotal.week]
+    else:
+        raise ValueError(
+            "Invalid period. Choose from 'weekly', 'monthly', or 'yearly'.")
+
+    stmt = (
+        select(*columns)
+        .where(PeriodTotal.user_id == user_id)
+        .group_by(*columns)
+        .order_by(*(column.desc() for column in columns))
+        .limit(limit)
+        .offset(offset)
+    )
+
+    with Session(engine) as session:
+        buckets = session.execute(stmt).all()
+
+    if period == "yearly":
+        return [str(year) for year, in buckets]
+
+    elif period == "monthly":
+        return [datetime(year, month, 1).strftime('%b %Y') for year, month in buckets]
+
+    else:
+        return [f"Week {week:02d} {year}" for year, week in buckets]
+
+
+def period_range(period_type: str, target_year: int, target_month: int = None, target_week: int = None):
+    """
+    Returns the half-open [start, end) timestamp range covering a period, so
+    queries can filter with plain comparisons on Transaction.timestamp and use
+    the (user_id, timestamp) index instead of extracting date parts per row.
+
+    Weeks follow strftime's %U numbering (matching the labels built by
+    get_summary_periods): they start on Sunday, and the days before the first
+    Sunday of the year are week 0.
+    """
+    year_start = datetime(target_year, 1, 1)
+    year_end = datetime(target_year + 1, 1, 1)
+
+    if period_type == 'year':
+        return year_start, year_end
+
+    elif period_type == 'month':
+        if not target_month:
+            raise ValueError(
+                "target_month is required for 'month' period type")
+        start = datetime(target_year, target_month, 1)
+        if target_month == 12:
+            return start, year_end
+        return start, datetime(target_year, target_month + 1, 1)
+
+    elif period_type == 'week':
+        if target_week is None:
+            raise ValueError("target_week is required for 'week' period type")
+        # weekday() is 0 for Monday, so this is the distance to the first Sunday
+        first_sunday = year_start + \
+            timedelta(days=(6 - year_start.weekday()) % 7)
+        if target_week == 0:
+            return year_start, first_sunday
+        start = first_sunday + timedelta(weeks=target_week - 1)
+        return start, min(start + timedelta(weeks=1), year_end)
+
+    raise ValueError(
+        "Invalid period_type. Choose from 'week', 'month', or 'year'.")
 
 
 def get_period_total(user_id: int, period_type: str, target_year: int, target_month: int = None, target_week: int = None):
@@ -270,60 +912,45 @@ def get_period_total(user_id: int, period_type: str, target_year: int, target_mo
         target_week: The target week number, required for 'week'.
     """
 
+    if period_type not in ('week', 'month', 'year'):
+        raise ValueError(
+            "Invalid period_type. Choose from 'week', 'month', or 'year'.")
+
     # --- 1. Common Logic: Define income and expense cases ---
     income_amount = case(
-        (Transaction.type_of_transaction == "income", Transaction.amount),
+        (PeriodTotal.type_of_transaction == "income", PeriodTotal.total),
         else_=0
     )
 
     expense_amount = case(
-        (Transaction.type_of_transaction == "expense", Transaction.amount),
+        (PeriodTotal.type_of_transaction == "expense", PeriodTotal.total),
         else_=0
     )
 
     # --- 2. Dynamic Query Building ---
-    # Start with the base select statement
+    # Read the maintained period totals instead of the raw transactions
     stmt = select(
-        extract('year', Transaction.timestamp).label("year"),
-        func.sum(income_amount).label("total_income"),
-        func.sum(expense_amount).label("total_expense")
+        func.coalesce(func.sum(income_amount), 0).label("total_income"),
+        func.coalesce(func.sum(expense_amount), 0).label("total_expense")
     )
 
-    # Base where and group_by clauses
     where_conditions = [
-        Transaction.user_id == user_id,
-        extract('year', Transaction.timestamp) == target_year
+        PeriodTotal.user_id == user_id,
+        PeriodTotal.year == target_year
     ]
-    group_by_columns = [extract('year', Transaction.timestamp)]
 
-    # Dynamically add clauses based on the period_type
     if period_type == 'month':
         if not target_month:
             raise ValueError(
                 "target_month is required for 'month' period type")
-        # Add month extraction to select, where, and group_by
-        stmt = stmt.add_columns(
-            extract('month', Transaction.timestamp).label("month"))
-        where_conditions.append(
-            extract('month', Transaction.timestamp) == target_month)
-        group_by_columns.append(extract('month', Transaction.timestamp))
+        where_conditions.append(PeriodTotal.month == target_month)
 
     elif period_type == 'week':
-        if not target_week:
+        if target_week is None:
             raise ValueError("target_week is required for 'week' period type")
-        # Add week extraction to select, where, and group_by
-        stmt = stmt.add_columns(
-            extract('week', Transaction.timestamp).label("week"))
-        where_conditions.append(
-            extract('week', Transaction.timestamp) == target_week)
-        group_by_columns.append(extract('week', Transaction.timestamp))
-
-    elif period_type != 'year':
-        raise ValueError(
-            "Invalid period_type. Choose from 'week', 'month', or 'year'.")
+        where_conditions.append(PeriodTotal.week == target_week)
 
-    # Finalize the statement with the dynamic clauses
-    stmt = stmt.where(and_(*where_conditions)).group_by(*group_by_columns)
+    stmt = stmt.where(and_(*where_conditions))
 
     # --- 3. Execute the Query ---
     with Session(engine) as session:
@@ -331,105 +958,162 @@ def get_period_total(user_id: int, period_type: str, target_year: int, target_mo
         return result
 
 
-def add_custom_category(user_id: int, name: str, type_of_transaction: str):
-    '''Add custom category to user'''
-    category = CustomCategory(
-        user_id=user_id,
-        name=name,
-        type_of_transaction=type_of_transaction
+def get_monthly_totals(user_id: int, months: int = 12):
+    """
+    Income and expense per month for the user's latest months with any
+    transactions, oldest first. Rows have year, month, total_income and
+    total_expense.
+    """
+    stmt = (
+        select(
+            PeriodTotal.year,
+            PeriodTotal.month,
+            func.sum(case(
+                (PeriodTotal.type_of_transaction == "income", PeriodTotal.total), else_=0
+            )).label("total_income"),
+            func.sum(case(
+                (PeriodTotal.type_of_transaction == "expense", PeriodTotal.total), else_=0
+            )).label("total_expense"),
+        )
+        .where(PeriodTotal.user_id == user_id)
+        .group_by(PeriodTotal.year, PeriodTotal.month)
+        .order_by(PeriodTotal.year.desc(), PeriodTotal.month.desc())
+        .limit(months)
     )
 
     with Session(engine) as session:
-        session.add(category)
-        session.commit()
+        return list(reversed(session.execute(stmt).all()))
 
 
-def get_category_id(category_name: str):
-    '''Get category ID from category name'''
+def _load_period_breakdown(user_id: int, period_type: str, target_year: int, target_month: int = None, target_week: int = None):
+    start, end = period_range(
+        period_type, target_year, target_month, target_week)
 
-    stmt = select(DefaultCategory.id).where(
-        DefaultCategory.name == category_name)
+    # One grouped query; build_breakdown folds it into categories and top
+    # descriptions
+    stmt = select(
+        Transaction.type_of_transaction,
+        Transaction.category_id,
+        Transaction.description,
+        func.sum(Transaction.amount),
+        func.count(),
+    ).where(
+        Transaction.user_id == user_id,
+        Transaction.timestamp >= start,
+        Transaction.timestamp < end,
+    ).group_by(
+        Transaction.type_of_transaction,
+        Transaction.category_id,
+        Transaction.description,
+    )
 
     with Session(engine) as session:
-        result = session.execute(stmt).scalar_one_or_none()
+        rows = session.execute(stmt).all()
 
-    if result:
-        return result
+    categories = category_registry.get(user_id)
 
-    else:
-        stmt = select(CustomCategory.id).where(
-            CustomCategory.name == category_name)
-        with Session(engine) as session:
-            result = session.execute(stmt).scalar_one()
+    def category_name(category_id):
+        category = categories.by_id(category_id)
+        return category.name if category else None
 
-        return result
+    return build_breakdown(rows, category_name)
 
 
-def get_categories_name(type_of_transaction: str, user_id: int = 0):
-    '''Get all categories'''
+# Breakdowns are cached per (user, period) until a write lands in the period,
+# or for PERIOD_SUMMARY_CACHE_TTL seconds for writes made by other processes
+period_summary_cache = PeriodSummaryCache(
+    _load_period_breakdown, ttl=config.PERIOD_SUMMARY_CACHE_TTL)
 
-    # SQL query for default and custom categories
-    stmt_default = select(DefaultCategory.name).where(
-        DefaultCategory.type_of_transaction == type_of_transaction)
-    stmt_custom = select(CustomCategory.name).where(
-        CustomCategory.type_of_transaction == type_of_transaction)
 
-    # Run the query
-    with Session(engine) as session:
-        default_categories = session.execute(stmt_default).scalars().all()
-        custom_categories = session.execute(stmt_custom).scalars().all()
+def get_period_breakdown(user_id: int, period_type: str, target_year: int, target_month: int = None, target_week: int = None):
+    """
+    Get a PeriodBreakdown for a week, month or year: income and expense
+    totals, totals per category and the top descriptions. Takes the same
+    arguments as get_period_total.
+    """
+    if period_type not in ('week', 'month', 'year'):
+        raise ValueError(
+            "Invalid period_type. Choose from 'week', 'month', or 'year'.")
 
-    categories_name = default_categories + custom_categories
+    return period_summary_cache.get(
+        user_id, period_type, target_year, target_month, target_week)
 
-    return categories_name
 
+def invalidate_period_summaries(rows):
+    """
+    Forget cached breakdowns for the periods that transaction rows (mappings
+    with user_id and timestamp) fall in. Call after the rows are committed.
+    """
+    period_summary_cache.invalidate(
+        {(row["user_id"], *period_keys(row["timestamp"])) for row in rows})
 
-def get_category_type(category_id: int):
 
-    stmt_default = select(DefaultCategory.type_of_transaction).where(
-        DefaultCategory.id == category_id)
+def _load_default_categories():
+    stmt = select(DefaultCategory.id, DefaultCategory.name,
+                  DefaultCategory.type_of_transaction).order_by(DefaultCategory.id)
 
     with Session(engine) as session:
-        result = session.execute(stmt_default).scalar_one_or_none()
+        return session.execute(stmt).all()
 
-    if result:
-        return result
 
-    else:
-        stmt_custom = select(CustomCategory.type_of_transaction).where(
-            CustomCategory.id == category_id)
+def _load_custom_categories(user_id: int):
+    stmt = select(CustomCategory.id, CustomCategory.name, CustomCategory.type_of_transaction).where(
+        CustomCategory.user_id == user_id).order_by(CustomCategory.id)
+
+    with Session(engine) as session:
+        return session.execute(stmt).all()
 
-        with Session(engine) as session:
-            result = session.execute(stmt_custom).scalar_one_or_none()
-            return result
 
+# Category lookups are served from memory; every write below invalidates it,
+# and CATEGORY_CACHE_TTL bounds how long writes from other processes go unseen
+category_registry = CategoryRegistry(
+    _load_default_categories, _load_custom_categories, ttl=config.CATEGORY_CACHE_TTL)
 
-def get_category_name_by_id(id: int):
-    '''Get category name with id'''
 
-    stmt_default = select(DefaultCategory.name).where(DefaultCategory.id == id)
-    stmt_custom = select(CustomCategory.name).where(CustomCategory.id == id)
+def add_custom_category(user_id: int, name: str, type_of_transaction: str):
+    '''Add custom category to user'''
+    category = CustomCategory(
+        user_id=user_id,
+        name=name,
+        type_of_transaction=type_of_transaction
+    )
 
     with Session(engine) as session:
-        result = session.execute(stmt_default).scalar_one_or_none()
+        session.add(category)
+        session.commit()
 
-    if result:
-        return result
-    else:
-        with Session(engine) as session:
-            result = session.execute(stmt_custom).scalar_one_or_none()
-            return result
+    category_registry.invalidate(user_id)
 
 
-def get_custom_categories_name_and_id(user_id: int, type_of_transaction: str):
+def get_category_id(category_name: str, user_id: int = 0):
+    '''Get category ID from category name'''
+    category = category_registry.get(user_id).by_name(category_name)
+    return category.id if category else None
 
-    stmt = select(CustomCategory.name).where(CustomCategory.user_id == user_id).where(
-        CustomCategory.type_of_transaction == type_of_transaction)
 
-    with Session(engine) as session:
-        result = session.execute(stmt).scalars().all()
+def get_categories_name(type_of_transaction: str, user_id: int = 0):
+    '''Get the default and the user's custom category names'''
+    return list(category_registry.get(user_id).names(type_of_transaction))
+
+
+def get_category_type(category_id: int, user_id: int = 0):
+    category = category_registry.get(user_id).by_id(category_id)
+    return category.type_of_transaction if category else None
+
+
+def get_category_name_by_id(id: int, user_id: int = 0):
+    '''Get category name with id'''
+    category = category_registry.get(user_id).by_id(id)
+    return category.name if category else None
 
-    return result
+
+def get_custom_categories_name_and_id(user_id: int, type_of_transaction: str):
+    '''Get (name, id) pairs of the user's custom categories'''
+    return [
+        (category.name, category.id)
+        for category in category_registry.get(user_id).custom
+        if category.type_of_transaction == type_of_transaction
+    ]
 
 
 def delete_category(user_id: int, category_id: int):
@@ -441,6 +1125,10 @@ def delete_category(user_id: int, category_id: int):
         session.execute(stmt)
         session.commit()
 
+    category_registry.invalidate(user_id)
+    # Breakdowns carry category names
+    period_summary_cache.invalidate_user(user_id)
+
 # Budget queries
 
 
@@ -494,45 +1182,114 @@ def get_spend_by_month(user_id: int, month: int, year: int):
     """Calculate total spending per category for a given month and year."""
     stmt = (
         select(
-            Transaction.category_id,
-            func.sum(Transaction.amount).label("total_spent")
+            PeriodTotal.category_id,
+            func.sum(PeriodTotal.total).label("total_spent")
+        )
+        .where(
+            and_(
+                PeriodTotal.user_id == user_id,
+                PeriodTotal.type_of_transaction == 'expense',
+                PeriodTotal.year == year,
+                PeriodTotal.month == month
+            )
+        )
+        .group_by(PeriodTotal.category_id)
+    )
+    with Session(engine) as session:
+        return session.execute(stmt).all()
+
+
+def get_budget_status(user_id: int, year: int, month: int):
+    """
+    Get the budget report for a month in one statement.
+
+    Each row has category_name, budgeted, spent and remaining for one budget,
+    plus the month's total_budgeted, total_spent, total_remaining and the
+    user's currency (the same on every row). Spending comes from
+    period_totals, aggregated per category and left joined to the budgets.
+    """
+    spend = (
+        select(
+            PeriodTotal.category_id,
+            func.sum(PeriodTotal.total).label("spent")
+        )
+        .where(
+            and_(
+                PeriodTotal.user_id == user_id,
+                PeriodTotal.type_of_transaction == 'expense',
+                PeriodTotal.year == year,
+                PeriodTotal.month == month
+            )
+        )
+        .group_by(PeriodTotal.category_id)
+        .subquery()
+    )
+    spent = func.coalesce(spend.c.spent, 0)
+
+    stmt = _with_category_name(
+        select(
+            Budget.budgeted_amount.label("budgeted"),
+            spent.label("spent"),
+            (Budget.budgeted_amount - spent).label("remaining"),
+            func.sum(Budget.budgeted_amount).over().label("total_budgeted"),
+            func.sum(spent).over().label("total_spent"),
+            (func.sum(Budget.budgeted_amount).over() -
+             func.sum(spent).over()).label("total_remaining"),
+            User.currency
         )
+        .select_from(Budget)
+        .join(User, User.id == Budget.user_id)
+        .outerjoin(spend, spend.c.category_id == Budget.category_id)
         .where(
             and_(
-                Transaction.user_id == user_id,
-                Transaction.type_of_transaction == 'expense',
-                extract('month', Transaction.timestamp) == month,
-                extract('year', Transaction.timestamp) == year
+                Budget.user_id == user_id,
+                Budget.year == year,
+                Budget.month == month
             )
         )
-        .group_by(Transaction.category_id)
+        .order_by(Budget.id),
+        Budget
     )
+
     with Session(engine) as session:
         return session.execute(stmt).all()
 
 # Create the table
 
 
+def _load_user_profile(user_id: int) -> UserProfile:
+    stmt = select(User.currency, User.username).where(User.id == user_id)
+    with Session(engine) as session:
+        # Raises NoResultFound for unknown users, which are never cached
+        return UserProfile(*session.execute(stmt).one())
+
+
+# Profiles are served from memory; writes below store the new row in it
+profile_cache = ProfileCache(
+    _load_user_profile, config.PROFILE_CACHE_SIZE, config.PROFILE_CACHE_TTL)
+
+
 def set_currency(user_id: int, currency_symbol: str):
     """Sets the currency for a user."""
     stmt = (
         update(User)
         .where(User.id == user_id)
         .values(currency=currency_symbol)
+        .returning(User.currency, User.username)
     )
     with Session(engine) as session:
-        session.execute(stmt)
+        updated = session.execute(stmt).one_or_none()
         session.commit()
 
+    if updated is None:
+        profile_cache.invalidate(user_id)
+    else:
+        profile_cache.set(user_id, UserProfile(*updated))
+
 
 def get_currency(user_id: int) -> str:
     """ Get the currency for user"""
-    stmt = (
-        select(User.currency)
-        .where(User.id == user_id)
-    )
-    with Session(engine) as session:
-        return session.execute(stmt).scalar_one()
+    return profile_cache.get(user_id).currency
 
 
 def delete_user_data(user_id: int):
@@ -546,8 +1303,221 @@ def delete_user_data(user_id: int):
             CustomCategory.user_id == user_id))
         # Delete budgets
         session.execute(delete(Budget).where(Budget.user_id == user_id))
+        # Delete period totals
+        session.execute(delete(PeriodTotal).where(
+            PeriodTotal.user_id == user_id))
+        session.commit()
+
+    category_registry.invalidate(user_id)
+    period_summary_cache.invalidate_user(user_id)
+
+
+# Bot state
+
+
+def load_conversation_states(name: str, newer_than: datetime = None) -> dict:
+    """
+    Get a conversation handler's saved states as
+    {JSON key: (JSON state, updated_at)}.
+
+    States last updated before newer_than are deleted instead: their
+    conversations would have timed out while the bot was down.
+    """
+    with Session(engine) as session:
+        if newer_than is not None:
+            session.execute(delete(ConversationState).where(
+                ConversationState.name == name,
+                ConversationState.updated_at < newer_than
+            ))
+            session.commit()
+        rows = session.execute(
+            select(ConversationState.key, ConversationState.state,
+                   ConversationState.updated_at)
+            .where(ConversationState.name == name)
+        ).all()
+    return {key: (state, updated_at) for key, state, updated_at in rows}
+
+
+def save_conversation_state(name: str, key: str, state: Optional[str]):
+    """Save a conversation's new state, or forget it when state is None."""
+    with Session(engine) as session:
+        if state is None:
+            session.execute(delete(ConversationState).where(
+                ConversationState.name == name,
+                ConversationState.key == key
+            ))
+        else:
+            stmt = _dialect_insert(ConversationState).values(
+                name=name, key=key, state=state, updated_at=datetime.now())
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=["name", "key"],
+                set_={"state": stmt.excluded.state,
+                      "updated_at": stmt.excluded.updated_at}
+            ))
+        session.commit()
+
+
+def load_user_state(user_id: int) -> dict:
+    """Get a user's saved user_data as {key: JSON value}."""
+    with Session(engine) as session:
+        rows = session.execute(
+            select(UserState.key, UserState.value)
+            .where(UserState.user_id == user_id)
+        ).all()
+    return dict(rows)
+
+
+def save_user_state(user_id: int, changed: dict, removed=()):
+    """Upsert the changed {key: JSON value} pairs of a user and delete removed keys."""
+    with Session(engine) as session:
+        if removed:
+            session.execute(delete(UserState).where(
+                UserState.user_id == user_id,
+                UserState.key.in_(list(removed))
+            ))
+        if changed:
+            now = datetime.now()
+            stmt = _dialect_insert(UserState)
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["user_id", "key"],
+                    set_={"value": stmt.excluded.value,
+                          "updated_at": stmt.excluded.updated_at}
+                ),
+                [dict(user_id=user_id, key=key, value=value, updated_at=now)
+                 for key, value in changed.items()]
+            )
+        session.commit()
+
+
+def delete_user_state(user_id: int):
+    """Forget all of a user's saved user_data."""
+    with Session(engine) as session:
+        session.execute(delete(UserState).where(UserState.user_id == user_id))
+        session.commit()
+
+
+def _add_missing_columns():
+    '''Add nullable columns that were added to a model after its table was created'''
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"]
+                        for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info("Added column %s.%s", table.name, column.name)
+
+
+def _schedule_legacy_recurring():
+    """
+    Give recurring transactions created before next_run_at existed a next run.
+
+    Their past occurrences were already posted by the old scheduler, so they
+    resume from today rather than from their start date.
+    """
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    stmt = select(RecurringTransaction).where(
+        RecurringTransaction.next_run_at.is_(None),
+        RecurringTransaction.last_run_at.is_(None)
+    )
+
+    with Session(engine) as session:
+        for rule in session.execute(stmt).scalars():
+            occurrence = rule.start_date
+            while occurrence < today:
+                occurrence = next_occurrence(
+                    occurrence, rule.frequency, rule.start_date.day)
+            if rule.end_date is None or occurrence <= rule.end_date:
+                rule.next_run_at = occurrence
         session.commit()
 
 
+def _fts_user_key(user_id: int) -> str:
+    '''The single-token form of a user id stored in transactions_fts.user_key'''
+    return f"u{user_id}".replace("-", "n")
+
+
+# An external-content FTS5 table: it stores only the index and reads
+# descriptions back from transactions (through the view, which adds the
+# user key) when asked for them. Two- and three-letter prefixes are indexed
+# too, so short search words don't expand over the whole vocabulary. The
+# triggers keep it in step with every insert, delete and update, including
+# bulk ones that bypass the ORM.
+_SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIEW IF NOT EXISTS transactions_fts_source AS
+    SELECT id, description, 'u' || replace(user_id, '-', 'n') AS user_key
+    FROM transactions
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        description, user_key,
+        content='transactions_fts_source', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_insert
+    AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts(rowid, description, user_key)
+        VALUES (new.id, new.description, 'u' || replace(new.user_id, '-', 'n'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_delete
+    AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, user_key)
+        VALUES ('delete', old.id, old.description, 'u' || replace(old.user_id, '-', 'n'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+    AFTER UPDATE OF description, user_id ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, user_key)
+        VALUES ('delete', old.id, old.description, 'u' || replace(old.user_id, '-', 'n'));
+        INSERT INTO transactions_fts(rowid, description, user_key)
+        VALUES (new.id, new.description, 'u' || replace(new.user_id, '-', 'n'));
+    END
+    """,
+]
+
+
+def _create_search_index():
+    '''Create the SQLite full-text index, indexing existing rows the first time'''
+    if engine.dialect.name != "sqlite":
+        return
+
+    with engine.begin() as connection:
+        exists = connection.scalar(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'transactions_fts'"))
+        for statement in _SQLITE_SEARCH_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(
+                "INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')"))
+            logger.info("Built the transaction search index")
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _schedule_legacy_recurring()
+    _create_search_index()
+
+    # create_all() skips tables that already exist, so indexes added to an
+    # existing model have to be created separately
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    # Databases created before period_totals existed need it backfilled
+    with Session(engine) as session:
+        has_transactions = session.scalar(select(Transaction.id).limit(1))
+        has_totals = session.scalar(select(PeriodTotal.user_id).limit(1))
+    if has_transactions and not has_totals:
+        rebuild_period_totals()
@@ -0,0 +1,124 @@
+"""
+Export of a user's full transaction history as CSV, JSON Lines or Parquet.
+
+Rows are streamed from the database in batches and written straight into a
+SpooledTemporaryFile, which moves itself to disk once it outgrows
+SPOOL_MAX_SIZE. Memory use stays flat however long the history is.
+Everything here blocks; handlers run export_transactions() on the database
+executor.
+"""
+import csv
+import io
+import itertools
+import json
+from tempfile import SpooledTemporaryFile
+
+from utils.database import iter_transactions_with_category
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional
+    pyarrow = None
+
+
+# Rows fetched from the cursor, and written to Parquet, at a time
+BATCH_SIZE = 1000
+
+# Exports bigger than this are spooled to disk rather than kept in memory
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+COLUMNS = ("id", "timestamp", "type", "amount", "category", "description")
+
+FILE_EXTENSIONS = {"csv": "csv", "jsonl": "jsonl", "parquet": "parquet"}
+
+
+def available_formats() -> tuple:
+    '''Export formats that can be written with the installed packages'''
+    if pyarrow is None:
+        return ("csv", "jsonl")
+    return ("csv", "jsonl", "parquet")
+
+
+def _write_csv(rows, stream) -> int:
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(COLUMNS)
+
+    count = 0
+    for row in rows:
+        writer.writerow((row.id, row.timestamp.isoformat(sep=" "), row.type_of_transaction,
+                         f"{row.amount:.2f}", row.category_name or "", row.description))
+        count += 1
+
+    # Leave the underlying file open for the caller
+    text.flush()
+    text.detach()
+    return count
+
+
+def _write_jsonl(rows, stream) -> int:
+    count = 0
+    for row in rows:
+        record = dict(zip(COLUMNS, (
+            row.id, row.timestamp.isoformat(), row.type_of_transaction,
+            row.amount, row.category_name, row.description)))
+        stream.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        stream.write(b"\n")
+        count += 1
+    return count
+
+
+def _write_parquet(rows, stream) -> int:
+    schema = pyarrow.schema([
+        ("id", pyarrow.int64()),
+        ("timestamp", pyarrow.timestamp("us")),
+        ("type", pyarrow.string()),
+        ("amount", pyarrow.float64()),
+        ("category", pyarrow.string()),
+        ("description", pyarrow.string()),
+    ])
+
+    count = 0
+    # One row group per batch, so only one batch is ever held as columns
+    with pyarrow.parquet.ParquetWriter(stream, schema) as writer:
+        while batch := list(itertools.islice(rows, BATCH_SIZE)):
+            writer.write_batch(pyarrow.RecordBatch.from_arrays([
+                pyarrow.array([row.id for row in batch], pyarrow.int64()),
+                pyarrow.array([row.timestamp for row in batch],
+                              pyarrow.timestamp("us")),
+                pyarrow.array([row.type_of_transaction for row in batch]),
+                pyarrow.array([row.amount for row in batch], pyarrow.float64()),
+                pyarrow.array([row.category_name for row in batch],
+                              pyarrow.string()),
+                pyarrow.array([row.description for row in batch]),
+            ], schema=schema))
+            count += len(batch)
+    return count
+
+
+WRITERS = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+
+
+def export_transactions(user_id: int, file_format: str):
+    """
+    Write a user's transactions to a spooled temporary file.
+
+    Returns (file, number of rows). The file is rewound and ready to read;
+    the caller closes it.
+    """
+    if file_format not in available_formats():
+        raise ValueError(f"Unsupported export format: {file_format}")
+
+    stream = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    rows = iter_transactions_with_category(user_id, batch_size=BATCH_SIZE)
+    try:
+        count = WRITERS[file_format](rows, stream)
+    except BaseException:
+        stream.close()
+        raise
+    finally:
+        rows.close()
+
+    stream.seek(0)
+    return stream, count
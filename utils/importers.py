@@ -0,0 +1,433 @@
+"""
+Bulk import of bank exports (CSV, OFX/QFX).
+
+Files are read a CSV line or a fixed-size OFX chunk at a time and written in
+chunks, so memory use stays flat however long the export is. Everything here blocks; handlers run
+import_transactions() on the database executor.
+"""
+import csv
+import html
+import itertools
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from utils import database
+from utils.database import category_registry
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+# Rows parsed, deduped and inserted per round trip
+CHUNK_SIZE = 1000
+
+# Characters read from an OFX file at a time; banks often send it as one line
+OFX_READ_SIZE = 64 * 1024
+
+# Transactions that can't be matched to a category are filed under these
+FALLBACK_CATEGORIES = {"expense": "Other expense", "income": "Other income"}
+
+# CSV headers we understand, lowercased
+CSV_COLUMNS = {
+    "date": ("date", "transaction date", "posted date", "posting date", "value date", "timestamp"),
+    "amount": ("amount", "transaction amount", "value"),
+    "debit": ("debit", "withdrawal", "withdrawals", "money out", "paid out"),
+    "credit": ("credit", "deposit", "deposits", "money in", "paid in"),
+    "description": ("description", "memo", "payee", "name", "details", "narrative", "reference"),
+    "category": ("category",),
+    "type": ("type", "transaction type"),
+}
+
+# A file's dates are all read with one format, picked by detect_date_format.
+# ISO_DATE stands for ISO 8601 (datetime.fromisoformat).
+ISO_DATE = "iso"
+# Formats where day and month can't be mixed up
+DATE_FORMATS = ("%Y/%m/%d", "%d %b %Y", "%d %B %Y", "%b %d, %Y")
+# Numeric formats as (day first, month first) pairs. Day-first is assumed
+# when no date in the file tells them apart.
+NUMERIC_DATE_FORMATS = (
+    ("%d/%m/%Y", "%m/%d/%Y"),
+    ("%d/%m/%y", "%m/%d/%y"),
+    ("%d-%m-%Y", "%m-%d-%Y"),
+    ("%d.%m.%Y", "%m.%d.%Y"),
+)
+
+TYPE_ALIASES = {
+    "income": "income", "credit": "income", "cr": "income", "deposit": "income",
+    "expense": "expense", "debit": "expense", "dr": "expense", "withdrawal": "expense",
+}
+
+# What follows a "<": the tag, and its value up to the end of the line
+_OFX_TAG = re.compile(r"(/?)([A-Za-z0-9.]+)>([^\r\n]*)")
+# The number in an amount cell, e.g. "1.234,50" in "EUR -1.234,50"
+_AMOUNT_NUMBER = re.compile(r"[0-9.,]*[0-9]")
+# Spaces and apostrophes used as thousands separators ("1 234,50", "1'234.50")
+_DIGIT_GAP = re.compile(r"(?<=[0-9])[\s'\u2009\u202f](?=[0-9])")
+
+
+class ImportedRow(NamedTuple):
+    timestamp: datetime
+    amount: float  # always positive
+    type_of_transaction: str  # 'income' or 'expense'
+    description: str
+    category: Optional[str] = None
+
+
+class ImportSummary(NamedTuple):
+    read: int
+    imported: int
+    duplicates: int
+    skipped: int
+
+
+def detect_format(file_name: str, head: bytes) -> Optional[str]:
+    '''Guess 'csv' or 'ofx' from the file name, then from its first bytes'''
+    extension = (file_name or "").rsplit(".", 1)[-1].lower()
+    if extension in ("ofx", "qfx"):
+        return "ofx"
+    if extension == "csv":
+        return "csv"
+
+    head = head.lstrip().upper()
+    if head.startswith((b"OFXHEADER", b"<OFX", b"<?XML")) and b"OFX" in head:
+        return "ofx"
+    return None
+
+
+def _parses(text: str, date_format: str) -> bool:
+    try:
+        datetime.strptime(text, date_format)
+    except ValueError:
+        return False
+    return True
+
+
+def detect_date_format(texts) -> Optional[str]:
+    """
+    Pick the one format a file's dates are written in.
+
+    Numeric dates like 01/02/2025 read either way, so texts is scanned until
+    a date settles it (13/01/2025 is day-first, 01/13/2025 month-first).
+    """
+    fallback = None
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        try:
+            datetime.fromisoformat(text)
+            return ISO_DATE
+        except ValueError:
+            pass
+
+        for date_format in DATE_FORMATS:
+            if _parses(text, date_format):
+                return date_format
+
+        for day_first, month_first in NUMERIC_DATE_FORMATS:
+            as_day_first = _parses(text, day_first)
+            as_month_first = _parses(text, month_first)
+            if as_day_first and not as_month_first:
+                return day_first
+            if as_month_first and not as_day_first:
+                return month_first
+            if as_day_first and fallback is None:
+                fallback = day_first
+    return fallback
+
+
+# Exports repeat the same few dates many times over, and strptime is slow
+@lru_cache(maxsize=4096)
+def parse_date(text: str, date_format: str = ISO_DATE) -> Optional[datetime]:
+    '''Parse text in date_format (from detect_date_format), or return None'''
+    text = text.strip()
+    if date_format != ISO_DATE:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            return None
+
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+    # Stored timestamps are naive UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """
+    Parse "-1,234.50", "-1.234,50", "EUR -1.234,50", "$-5.00", "(12.00)",
+    "RM 12.00" or "12.00-" into a signed float.
+
+    A minus sign anywhere around the number, before or after a currency,
+    makes it negative, as do enclosing parentheses.
+
+    The last of "." and "," in a number is the decimal point when both
+    appear. A lone comma is one unless exactly three digits follow it:
+    "1,234" could be either, so it reads as None rather than a guess.
+    """
+    text = _DIGIT_GAP.sub("", text.strip())
+    match = _AMOUNT_NUMBER.search(text)
+    if not match:
+        return None
+    number = match.group(0)
+    around = text[:match.start()] + text[match.end():]
+    negative = "-" in around or "\u2212" in around or (
+        text.startswith("(") and text.endswith(")"))
+
+    if "," in number and "." in number:
+        decimal = "," if number.rfind(",") > number.rfind(".") else "."
+    elif number.count(",") == 1:
+        if len(number.rpartition(",")[2]) == 3:
+            return None
+        decimal = ","
+    elif number.count(".") > 1:
+        decimal = ","
+    else:
+        decimal = "."
+    separator = "." if decimal == "," else ","
+
+    if decimal in number:
+        whole, _, fraction = number.rpartition(decimal)
+    else:
+        whole, fraction = number, ""
+    if separator in fraction or decimal in whole:
+        return None
+    # Thousands separators only ever split off groups of three digits
+    groups = whole.split(separator)
+    if len(groups) > 1 and (not 1 <= len(groups[0]) <= 3
+                            or any(len(group) != 3 for group in groups[1:])):
+        return None
+
+    amount = float(f"{''.join(groups) or '0'}.{fraction or '0'}")
+    return -amount if negative else amount
+
+
+def _row(timestamp, amount, description, type_of_transaction=None, category=None):
+    if timestamp is None or amount is None:
+        return None
+    if type_of_transaction is None:
+        type_of_transaction = "expense" if amount < 0 else "income"
+    return ImportedRow(
+        timestamp=timestamp,
+        amount=round(abs(amount), 2),
+        type_of_transaction=type_of_transaction,
+        description=description.strip() or "Imported",
+        category=category.strip() if category and category.strip() else None,
+    )
+
+
+def parse_csv(stream):
+    """
+    Yield an ImportedRow, or None for a row that can't be read, per CSV line.
+
+    Needs a date column and either an amount column (negative for expenses,
+    unless a type column says otherwise) or debit/credit columns. The stream
+    must be seekable: it is read once up to the first date that settles the
+    file's date format, then again from the top.
+    """
+    reader = csv.DictReader(stream)
+    headers = {name.strip().lower(): name for name in reader.fieldnames or ()}
+    columns = {
+        key: next((headers[alias] for alias in aliases if alias in headers), None)
+        for key, aliases in CSV_COLUMNS.items()
+    }
+    if columns["date"] is None or (columns["amount"] is None and columns["debit"] is None
+                                   and columns["credit"] is None):
+        raise ValueError(
+            "CSV needs a date column and an amount (or debit/credit) column")
+
+    def cell(record, key):
+        return (record.get(columns[key]) or "") if columns[key] else ""
+
+    date_format = detect_date_format(cell(record, "date") for record in reader)
+    stream.seek(0)
+    reader = csv.DictReader(stream)
+
+    for record in reader:
+        type_of_transaction = TYPE_ALIASES.get(cell(record, "type").strip().lower())
+
+        if columns["amount"] is not None and cell(record, "amount").strip():
+            amount = parse_amount(cell(record, "amount"))
+        else:
+            debit = parse_amount(cell(record, "debit")) if cell(record, "debit").strip() else None
+            credit = parse_amount(cell(record, "credit")) if cell(record, "credit").strip() else None
+            if debit:
+                amount = -abs(debit)
+            elif credit:
+                amount = abs(credit)
+            else:
+                amount = None
+
+        timestamp = parse_date(cell(record, "date"), date_format) if date_format else None
+        yield _row(timestamp, amount, cell(record, "description"),
+                   type_of_transaction, cell(record, "category"))
+
+
+def parse_ofx(stream):
+    """
+    Yield an ImportedRow, or None for one that can't be read, per <STMTTRN>.
+
+    Works on both SGML (OFX 1.x, unclosed tags) and XML (OFX 2.x, QFX)
+    files, a tag at a time, however the file is split into lines.
+    """
+    current = None
+    for closing, tag, value in _ofx_tags(stream):
+        tag = tag.upper()
+        if tag == "STMTTRN":
+            if closing and current is not None:
+                yield _ofx_row(current)
+            current = None if closing else {}
+        elif current is not None and not closing:
+            current[tag] = html.unescape(value.strip())
+
+
+def _ofx_tags(stream):
+    '''Yield (closing "/" or "", tag, value) per tag, reading fixed-size chunks'''
+    pending = ""
+    while chunk := stream.read(OFX_READ_SIZE):
+        pieces = (pending + chunk).split("<")
+        # The last piece may be a tag cut off by the chunk boundary
+        pending = pieces.pop()
+        for piece in pieces:
+            match = _OFX_TAG.match(piece)
+            if match:
+                yield match.groups()
+
+    match = _OFX_TAG.match(pending)
+    if match:
+        yield match.groups()
+
+
+def _ofx_row(fields: dict):
+    # DTPOSTED looks like 20250131120000.000[-5:EST]; the zone is dropped
+    posted = re.match(r"\d{8}(\d{6})?", fields.get("DTPOSTED", ""))
+    timestamp = None
+    if posted:
+        timestamp = datetime.strptime(
+            posted.group(0), "%Y%m%d%H%M%S" if posted.group(1) else "%Y%m%d")
+
+    name, memo = fields.get("NAME", ""), fields.get("MEMO", "")
+    description = f"{name} - {memo}" if name and memo and memo != name else name or memo
+    amount = parse_amount(fields["TRNAMT"]) if fields.get("TRNAMT") else None
+    return _row(timestamp, amount, description)
+
+
+PARSERS = {"csv": parse_csv, "ofx": parse_ofx}
+
+
+class _CategoryMapper:
+    '''Picks a category for each imported row'''
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self._load()
+        # What the user filed each description under before
+        self._history = database.get_description_categories(user_id)
+
+    def _load(self):
+        categories = category_registry.get(self.user_id)
+        self._by_name = {}
+        for type_of_transaction in ("income", "expense"):
+            for name in categories.names(type_of_transaction):
+                self._by_name.setdefault(
+                    (type_of_transaction, name.lower()), categories.by_name(name))
+
+    def category_for(self, row: ImportedRow):
+        '''Return (category_id, category_type) for a row'''
+        type_ = row.type_of_transaction
+
+        if row.category:
+            category = self._by_name.get((type_, row.category.lower()))
+            if category:
+                return category.id, category.type_of_transaction
+
+        known = self._history.get((type_, row.description.lower()))
+        if known:
+            return known
+
+        return self._fallback(type_)
+
+    def _fallback(self, type_of_transaction: str):
+        name = FALLBACK_CATEGORIES[type_of_transaction]
+        category = self._by_name.get((type_of_transaction, name.lower()))
+        if category is None:
+            database.add_custom_category(self.user_id, name, type_of_transaction)
+            self._load()
+            category = self._by_name[(type_of_transaction, name.lower())]
+        return category.id, category.type_of_transaction
+
+
+def _chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def import_transactions(user_id: int, path: str, file_format: str) -> ImportSummary:
+    """
+    Import a CSV or OFX file into a user's transactions.
+
+    Rows that match an existing transaction on type, amount, description and
+    timestamp are skipped, so importing overlapping exports twice is safe.
+    Each chunk is committed on its own.
+    """
+    parse = PARSERS[file_format]
+    mapper = _CategoryMapper(user_id)
+    # Only dedupe against what was there before this import started, so
+    # genuine repeats within the file (two identical coffees) are kept
+    max_existing_id = database.get_max_transaction_id()
+    read = imported = duplicates = skipped = 0
+
+    with open(path, encoding="utf-8-sig", errors="replace", newline="") as stream:
+        for chunk in _chunks(parse(stream), CHUNK_SIZE):
+            read += len(chunk)
+            rows = [row for row in chunk if row is not None]
+            skipped += len(chunk) - len(rows)
+            if not rows:
+                continue
+
+            existing = database.count_matching_transactions(
+                user_id,
+                min(row.timestamp for row in rows),
+                max(row.timestamp for row in rows),
+                max_existing_id,
+            )
+
+            new_rows = []
+            for row in rows:
+                key = (row.type_of_transaction, row.amount,
+                       row.description, row.timestamp)
+                if existing[key] > 0:
+                    existing[key] -= 1
+                    duplicates += 1
+                    continue
+
+                category_id, category_type = mapper.category_for(row)
+                new_rows.append(dict(
+                    user_id=user_id,
+                    type_of_transaction=row.type_of_transaction,
+                    amount=row.amount,
+                    description=row.description,
+                    timestamp=row.timestamp,
+                    category_id=category_id,
+                    category_type=category_type,
+                ))
+
+            if new_rows:
+                imported += database.save_transactions(new_rows)
+
+    logger.info("Imported %d of %d row(s) for user %s (%d duplicate, %d skipped)",
+                imported, read, user_id, duplicates, skipped)
+    return ImportSummary(read, imported, duplicates, skipped)
@@ -0,0 +1,147 @@
+"""
+Inline keyboards and message templates, built once and reused.
+
+InlineKeyboardMarkup objects are immutable, so one instance can be sent on
+every call. Static menus and texts are built here at import; the budget
+month picker is rebuilt only when the month changes.
+
+Category keyboards are memoized per (user's category version, transaction
+type, footer), so the same markup is sent again on every /transaction start
+until that user's categories change and their version moves on.
+"""
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+
+from utils.async_database import run_sync
+from utils.categories import CategorySet
+from utils.database import category_registry
+from utils.misc import list_chunker
+
+
+def _markup(*rows) -> InlineKeyboardMarkup:
+    '''Build a keyboard from rows of (text, callback_data) pairs'''
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(text, callback_data=data) for text, data in row]
+        for row in rows
+    ])
+
+
+# Messages
+
+WELCOME_MESSAGE = (
+    "👋 <b>Welcome to Expentrax!</b>\n\n"
+    "Hey there! I'm your personal finance manager, built to help you track "
+    "your income and expenses quickly and easily, right here in Telegram.\n\n"
+    "Ready to start managing your money? Here's a quick look at what I can do:\n\n"
+
+    "🚀 <b>Main Commands</b>\n"
+    "- /transaction — <b>Log Finances.</b> Starts a conversation to record a new <b>Income</b> or <b>Expense</b>.\n"
+    "- /budget - <b>Budgeting.</b> Set/Change or Check your budgets.\n"
+    "- /recurring - <b>Set recurring transactions.</b> Transactions that recurring daily, weekly, or monthly.\n"
+    "- /history — <b>View Reports.</b> Check your transactions, get recent history, or view summaries (yearly, monthly, or weekly).\n"
+    "- /search — <b>Find Transactions.</b> Look up transactions by description, e.g. /search coffee.\n"
+    "- /settings — <b>Manage Categories.</b> View all available categories, and <b>add or remove your own custom categories</b>.\n\n"
+
+    "🎯 <b>Ready to Start?</b>\n"
+    "To log your first expense, just type or click the /transaction command below!\n\n"
+    "If you have any questions, you can always check the full list of commands using the menu button. Happy tracking!"
+)
+
+HISTORY_MENU_PROMPT = "📋 Welcome to the transaction history! What would you like to do?"
+SUMMARY_PERIOD_PROMPT = "📅 Please specify a summary period:"
+BUDGET_MONTH_PROMPT = "Which month are you setting or changing the budget for?"
+
+
+# Static menus
+
+TRANSACTION_TYPE_KEYBOARD = _markup(
+    [("💸 Expense", "Expense"), ("💰 Income", "Income")],
+)
+
+FREQUENCY_KEYBOARD = _markup(
+    [("Daily", "daily"), ("Weekly", "weekly"), ("Monthly", "monthly")],
+)
+
+HISTORY_MENU_KEYBOARD = _markup(
+    [("Recent ✅", "recent"), ("Summary 📊", "summary"), ("Charts 📈", "charts")],
+    [("Browse 🔎", "browse")],
+)
+
+SUMMARY_PERIOD_KEYBOARD = _markup(
+    [("Weekly 📅", "weekly"), ("Monthly 📅", "monthly"), ("Yearly 📅", "yearly")],
+    [("⬅️ Back", "start_history")],
+)
+
+CHART_MENU_KEYBOARD = _markup(
+    [("🥧 This month by category", "chart_pie")],
+    [("📊 This year by category", "chart_bar")],
+    [("📈 Monthly trend", "chart_trend")],
+    [("⬅️ Back", "start_history")],
+)
+
+SETTINGS_MENU_KEYBOARD = _markup(
+    [("➕ Add Category", "add_category"),
+     ("👁️ View Categories", "view_categories"),
+     ("🗑️ Delete Categories", "delete_categories")],
+    [("💵 Set Currency", "set_currency"), ("🔄 Reset Data", "reset_data")],
+)
+
+CATEGORY_TYPE_KEYBOARD = _markup(
+    [("💸 Expense", "expense"), ("💰 Income", "income")],
+    [("🔙 Back", "start_settings")],
+)
+
+RESET_CONFIRM_KEYBOARD = _markup(
+    [("✅ Yes, reset my data", "confirm_reset"), ("❌ No, cancel", "cancel_reset")],
+)
+
+BUDGET_MENU_KEYBOARD = _markup(
+    [("Set/Change", "set_change_budget"), ("Check", "check_budget")],
+)
+
+
+@lru_cache(maxsize=2)
+def _budget_month_markup(year: int, month: int) -> InlineKeyboardMarkup:
+    this_month = date(year, month, 1)
+    next_month = (this_month + timedelta(days=32)).replace(day=1)
+    return _markup(
+        [(this_month.strftime("%B %Y"), this_month.strftime("%B %Y")),
+         (next_month.strftime("%B %Y"), next_month.strftime("%B %Y"))],
+        [("Back", "start_budget")],
+    )
+
+
+def budget_month_keyboard(today: datetime = None) -> InlineKeyboardMarkup:
+    """Get the this month / next month budget picker, built once per month."""
+    today = today or datetime.now()
+    return _budget_month_markup(today.year, today.month)
+
+
+@lru_cache(maxsize=2048)
+def _category_markup(categories: CategorySet, type_of_transaction: str, footer: tuple) -> InlineKeyboardMarkup:
+    # CategorySets hash by version, so a user's new categories miss the cache
+    names = categories.names(type_of_transaction)
+
+    keyboard = [
+        [InlineKeyboardButton(category, callback_data=category)
+         for category in row]
+        for row in list_chunker(categories=names, chunk_size=3)
+    ]
+    keyboard.extend(
+        [InlineKeyboardButton(text, callback_data=data)]
+        for text, data in footer
+    )
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def category_keyboard(user_id: int, type_of_transaction: str, footer: tuple = ()) -> InlineKeyboardMarkup:
+    """
+    Get the category picker for a user.
+
+    type_of_transaction is 'income' or 'expense'. footer holds extra
+    (text, callback_data) buttons, one per row, added below the categories.
+    """
+    categories = await run_sync(category_registry.get, user_id)
+    return _category_markup(categories, type_of_transaction, footer)
@@ -1,4 +1,6 @@
+import calendar
 import re
+from datetime import datetime, timedelta
 
 def list_chunker(categories: list, chunk_size: int):
     '''Convert categories into chunk of categories'''
@@ -14,4 +16,26 @@ def is_valid_currency(text: str) -> bool:
     Check if a string is a valid currency amount (up to 2 decimal places).
     Examples of valid inputs: '10', '10.50', '0.99'
     """
-    return bool(CURRENCY_REGEX.match(text.strip()))
\ No newline at end of file
+    return bool(CURRENCY_REGEX.match(text.strip()))
+
+def next_occurrence(occurrence: datetime, frequency: str, anchor_day: int) -> datetime:
+    """
+    Get the occurrence after this one for a 'daily', 'weekly' or 'monthly'
+    schedule. Monthly schedules stay on anchor_day (the start date's day),
+    falling back to the last day of shorter months.
+    """
+    if frequency == "daily":
+        return occurrence + timedelta(days=1)
+
+    elif frequency == "weekly":
+        return occurrence + timedelta(weeks=1)
+
+    elif frequency == "monthly":
+        # occurrence.month is 1-based, so this is already the next month
+        year, month = divmod(occurrence.year * 12 + occurrence.month, 12)
+        month += 1
+        day = min(anchor_day, calendar.monthrange(year, month)[1])
+        return occurrence.replace(year=year, month=month, day=day)
+
+    raise ValueError(
+        "Invalid frequency. Choose from 'daily', 'weekly', or 'monthly'.")
@@ -0,0 +1,248 @@
+"""
+Conversation state and user_data kept in the database across restarts.
+
+DatabasePersistence stores each persistent ConversationHandler's states in
+conversation_states and each user's user_data, one key per row, in
+user_states. Only what changed is written: PTB hands over the conversations
+and users touched since the last save, and user_data is compared key by key
+with what was last written.
+
+PTB only times a conversation out once it has handled an update in it, so
+conversations restored at startup are ended by expire_restored_conversations
+when their timeout runs out, unless the user has picked them up by then.
+
+Nothing is loaded for users up front. A user's user_data is read the first
+time one of their updates is handled, and dropped again from memory once
+they have been idle past the conversation timeout.
+"""
+import json
+import time
+from datetime import date, datetime, timedelta
+
+from telegram.ext import Application, BasePersistence, ContextTypes, ConversationHandler, PersistenceInput
+
+from utils import database
+from utils.async_database import run_sync
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def _tag(value):
+    '''JSON default= hook for the non-JSON types user_data holds'''
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} can't be persisted")
+
+
+def _untag(value: dict):
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    return value
+
+
+def dumps(value) -> str:
+    return json.dumps(value, default=_tag, separators=(",", ":"), sort_keys=True)
+
+
+def loads(text: str):
+    return json.loads(text, object_hook=_untag)
+
+
+class DatabasePersistence(BasePersistence):
+    """
+    Persist conversations and user_data in the bot's database.
+
+    conversation_timeout (seconds) is the ConversationHandlers' timeout.
+    Saved conversations older than that are dropped on startup, since their
+    timeout jobs did not survive the restart, and users idle for longer have
+    their user_data evicted by evict_idle_users.
+    """
+
+    def __init__(self, conversation_timeout: float = None, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.conversation_timeout = conversation_timeout
+        # user id -> {key: JSON value} as last read or written
+        self._written = {}
+        # user id -> time.monotonic() of their last update
+        self._last_seen = {}
+        # conversation name -> {key: datetime its restored state times out}
+        self._restored = {}
+
+    # Users
+
+    async def get_user_data(self) -> dict:
+        # Loaded per user by refresh_user_data instead
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        self._last_seen[user_id] = time.monotonic()
+        if user_id in self._written:
+            return
+
+        saved = await run_sync(database.load_user_state, user_id)
+        self._written[user_id] = saved
+        for key, value in saved.items():
+            # Keep anything a handler already set before the load finished
+            user_data.setdefault(key, loads(value))
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        written = self._written.setdefault(user_id, {})
+        current = {}
+        for key, value in data.items():
+            try:
+                current[key] = dumps(value)
+            except (TypeError, ValueError) as error:
+                logger.warning("Not persisting user_data[%r] of %s: %s", key, user_id, error)
+                if key in written:
+                    current[key] = written[key]
+
+        changed = {key: value for key, value in current.items()
+                   if written.get(key) != value}
+        removed = [key for key in written if key not in current]
+        if not changed and not removed:
+            return
+
+        await run_sync(database.save_user_state, user_id, changed, removed)
+        self._written[user_id] = current
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._written.pop(user_id, None)
+        self._last_seen.pop(user_id, None)
+        await run_sync(database.delete_user_state, user_id)
+
+    def idle_users(self, idle_for: float) -> list:
+        '''Users whose last update was more than idle_for seconds ago'''
+        cutoff = time.monotonic() - idle_for
+        return [user_id for user_id, seen in self._last_seen.items() if seen < cutoff]
+
+    # Conversations
+
+    async def get_conversations(self, name: str) -> dict:
+        newer_than = None
+        if self.conversation_timeout:
+            newer_than = datetime.now() - timedelta(seconds=self.conversation_timeout)
+        saved = await run_sync(database.load_conversation_states, name, newer_than)
+
+        conversations = {}
+        for key, (state, updated_at) in saved.items():
+            key = tuple(loads(key))
+            conversations[key] = loads(state)
+            if self.conversation_timeout:
+                self._restored.setdefault(name, {})[key] = (
+                    updated_at + timedelta(seconds=self.conversation_timeout))
+        return conversations
+
+    def pop_restored_conversations(self, name: str) -> dict:
+        '''Take the {key: timeout datetime} of the states restored for name'''
+        return self._restored.pop(name, {})
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        await run_sync(
+            database.save_conversation_state, name, dumps(list(key)),
+            None if new_state is None else dumps(new_state))
+
+    # Not stored: the bot keeps nothing in chat_data, bot_data or callback data
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # Every update is written as it is handed over
+        pass
+
+
+async def _end_restored_conversation(context: ContextTypes.DEFAULT_TYPE) -> None:
+    handler, key = context.job.data
+    # Once the user has sent an update in it, PTB times the key out itself
+    if key in handler.timeout_jobs:
+        return
+    # ConversationHandler has no public way to end a conversation; this is
+    # what its own timeout does, and the removal is persisted like any other
+    handler._update_state(ConversationHandler.END, key)
+
+
+async def expire_restored_conversations(application: Application) -> None:
+    """
+    Schedule the end of every conversation restored from the database.
+
+    Run from post_init, once the ConversationHandlers have loaded their
+    states. Each is ended when its saved state times out, counting from
+    its last update before the restart.
+    """
+    persistence = application.persistence
+    if not isinstance(persistence, DatabasePersistence):
+        return
+
+    now = datetime.now()
+    restored = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not isinstance(handler, ConversationHandler) or not handler.name:
+                continue
+            for key, expires in persistence.pop_restored_conversations(handler.name).items():
+                application.job_queue.run_once(
+                    _end_restored_conversation,
+                    when=max((expires - now).total_seconds(), 0),
+                    data=(handler, key),
+                    name=f"expire_{handler.name}_conversation",
+                )
+                restored += 1
+    if restored:
+        logger.info("Restored %d conversation(s)", restored)
+
+
+async def evict_idle_users(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Drop the user_data of users idle past the conversation timeout.
+
+    Their conversations have timed out by then, so what is left in user_data
+    is scratch from finished flows; dropping it also deletes the saved copy.
+    """
+    application = context.application
+    persistence = application.persistence
+    if not isinstance(persistence, DatabasePersistence) or not persistence.conversation_timeout:
+        return
+
+    idle = persistence.idle_users(persistence.conversation_timeout)
+    for user_id in idle:
+        application.drop_user_data(user_id)
+    if idle:
+        logger.info("Evicted user_data of %d idle user(s)", len(idle))
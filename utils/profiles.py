@@ -0,0 +1,63 @@
+"""
+In-process cache of each user's profile: their settings from the users table.
+
+Nearly every handler needs the user's currency, so profiles are loaded on
+first use and kept in an LRU cache bounded in size and age. utils.database
+passes in the loader and writes through whenever it changes a profile; the
+age limit bounds how long a change made by another process goes unseen.
+"""
+import threading
+from typing import NamedTuple, Optional
+
+from utils.cache import LRUCache
+
+
+class UserProfile(NamedTuple):
+    currency: str
+    username: Optional[str]
+
+
+class ProfileCache:
+    '''Caches a UserProfile per user'''
+
+    def __init__(self, load, maxsize: int = 4096, ttl: float = None):
+        # load(user_id) -> UserProfile, raising if the user doesn't exist
+        self._load = load
+        self._profiles = LRUCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        # Bumped on every write so a load that raced with it is not cached
+        self._generation = 0
+
+    def get(self, user_id: int) -> UserProfile:
+        '''Get a user's profile, loading it on a cache miss'''
+        profile = self._profiles.get(user_id)
+        if profile is not None:
+            return profile
+
+        generation = self._generation
+        profile = self._load(user_id)
+
+        with self._lock:
+            if generation == self._generation:
+                self._profiles.set(user_id, profile)
+
+        return profile
+
+    def cached(self, user_id: int) -> Optional[UserProfile]:
+        '''Get a user's profile only if it is cached, never loading it'''
+        return self._profiles.get(user_id)
+
+    def set(self, user_id: int, profile: UserProfile):
+        '''Store a profile that was just written to the database'''
+        with self._lock:
+            self._generation += 1
+            self._profiles.set(user_id, profile)
+
+    def invalidate(self, user_id: int = None):
+        '''Forget a user's cached profile, or everyone's if no user is given'''
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._profiles.clear()
+            else:
+                self._profiles.pop(user_id)
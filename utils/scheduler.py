@@ -1,10 +1,19 @@
-import schedule
-import time
-import threading
-from datetime import datetime
-from sqlalchemy import select
+import multiprocessing
+import os
+import socket
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, update, or_
+from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm import Session
-from utils.database import engine, RecurringTransaction, Transaction, save_transaction
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes, JobQueue
+from telegram.helpers import escape_markdown
+from utils.async_database import run_sync, get_currency
+from utils.config import RECURRING_WORKERS
+from utils.database import DEFAULT_CURRENCY, engine, RecurringTransaction, insert_transactions, invalidate_period_summaries
+from utils.misc import next_occurrence
 
 import logging
 
@@ -15,57 +24,208 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
-def check_recurring_transactions():
-    with Session(engine) as session:
-        today = datetime.now().date()
-        stmt = select(RecurringTransaction).where(
-            RecurringTransaction.start_date <= today)
-        recurring_transactions = session.execute(stmt).scalars().all()
-
-        for trans in recurring_transactions:
-            if trans.end_date and trans.end_date.date() < today:
-                continue
-
-            last_transaction_stmt = select(Transaction).where(
-                Transaction.description == trans.description
-            ).order_by(Transaction.timestamp.desc())
-            last_transaction = session.execute(
-                last_transaction_stmt).scalar_one_or_none()
-
-            should_create = False
-            if not last_transaction:
-                should_create = True
-            else:
-                last_transaction_date = last_transaction.timestamp.date()
-                if trans.frequency == "daily" and (today - last_transaction_date).days >= 1:
-                    should_create = True
-                elif trans.frequency == "weekly" and (today - last_transaction_date).days >= 7:
-                    should_create = True
-                elif trans.frequency == "monthly" and (today.month != last_transaction_date.month or today.year != last_transaction_date.year):
-                    should_create = True
-
-            if should_create:
-                save_transaction(
-                    user_id=trans.user_id,
-                    type_of_transaction=trans.type_of_transaction,
-                    amount=trans.amount,
-                    description=trans.description,
-                    timestamp=datetime.now(),
-                    category_id=trans.category_id,
-                    category_type=trans.category_type
-                )
-                logger.info(
-                    f"Created recurring transaction for user {trans.user_id}")
+# Recurring rules handled per database transaction
+BATCH_SIZE = 500
+
+# How long a worker may hold a batch before others may take it over
+LEASE_DURATION = timedelta(minutes=5)
+
+
+def due_occurrences(rule: RecurringTransaction, now: datetime):
+    """
+    Get the occurrences of a rule that are due at `now`, and the rule's next
+    run after them (None once it is past end_date). Includes every occurrence
+    missed while the bot was down.
+    """
+    occurrences = []
+    occurrence = rule.next_run_at
+    while occurrence is not None and occurrence <= now:
+        if rule.end_date and occurrence > rule.end_date:
+            occurrence = None
+            break
+        occurrences.append(occurrence)
+        occurrence = next_occurrence(
+            occurrence, rule.frequency, rule.start_date.day)
+
+    if occurrence is not None and rule.end_date and occurrence > rule.end_date:
+        occurrence = None
+
+    return occurrences, occurrence
+
+
+def _claim_batch(session: Session, now: datetime, worker: str, shard: int, shards: int) -> list:
+    """
+    Lease up to BATCH_SIZE due rules of a shard to this worker and return
+    them. Rules leased to a worker that died become claimable again once the
+    lease expires.
+    """
+    clock = datetime.now()
+    lease_expires_at = clock + LEASE_DURATION
+    claimable = or_(
+        RecurringTransaction.lease_expires_at.is_(None),
+        RecurringTransaction.lease_expires_at < clock
+    )
 
+    due = (
+        select(RecurringTransaction.id)
+        .where(RecurringTransaction.next_run_at <= now, claimable)
+        .order_by(RecurringTransaction.next_run_at)
+        .limit(BATCH_SIZE)
+    )
+    if shards > 1:
+        # SQL's % keeps the dividend's sign, and group chat ids are
+        # negative; shift the remainder into 0..shards-1
+        due = due.where(
+            (RecurringTransaction.user_id % shards + shards) % shards == shard)
+
+    # claimable is repeated on the UPDATE so two workers racing for the same
+    # rows can't both win
+    session.execute(
+        update(RecurringTransaction)
+        .where(RecurringTransaction.id.in_(due.scalar_subquery()), claimable)
+        .values(lease_owner=worker, lease_expires_at=lease_expires_at)
+    )
+    session.commit()
+
+    return session.execute(
+        select(RecurringTransaction).where(
+            RecurringTransaction.lease_owner == worker,
+            RecurringTransaction.lease_expires_at == lease_expires_at
+        )
+    ).scalars().all()
+
+
+def check_recurring_transactions(now: datetime = None, shard: int = 0, shards: int = 1) -> list:
+    """
+    Post every due occurrence of the recurring transactions in a shard (users
+    with user_id % shards == shard; by default a single shard of everyone).
+
+    Due rules are leased in batches through the next_run_at index. Each
+    batch's occurrences are inserted and the rules advanced and released in
+    one database transaction; the (recurring_id, timestamp) unique key makes
+    a retry after a crash skip occurrences that were already posted. Returns
+    the inserted transaction rows.
+    """
+    now = now or datetime.now()
+    worker = f"{socket.gethostname()}:{os.getpid()}:{shard}"
+    posted = []
 
-def run_scheduler():
-    schedule.every().day.at("00:00").do(check_recurring_transactions)
     while True:
-        schedule.run_pending()
-        time.sleep(1)
+        with Session(engine) as session:
+            rules = _claim_batch(session, now, worker, shard, shards)
+            if not rules:
+                break
+
+            rows = []
+            schedule_updates = []
+            for rule in rules:
+                occurrences, next_run_at = due_occurrences(rule, now)
+                rows.extend(
+                    dict(
+                        user_id=rule.user_id,
+                        type_of_transaction=rule.type_of_transaction,
+                        amount=rule.amount,
+                        description=rule.description,
+                        timestamp=occurrence,
+                        category_id=rule.category_id,
+                        category_type=rule.category_type,
+                        recurring_id=rule.id
+                    )
+                    for occurrence in occurrences
+                )
+                schedule_updates.append(dict(
+                    id=rule.id,
+                    next_run_at=next_run_at,
+                    last_run_at=occurrences[-1] if occurrences else rule.last_run_at,
+                    lease_owner=None,
+                    lease_expires_at=None
+                ))
+
+            inserted = insert_transactions(session, rows)
+            # Bulk UPDATE by primary key, one statement for the whole batch
+            session.execute(update(RecurringTransaction), schedule_updates)
+            session.commit()
+
+        posted.extend(inserted)
+        logger.info("Posted %s recurring transaction(s) for %s rule(s) in shard %s/%s",
+                    len(inserted), len(rules), shard, shards)
+
+    return posted
+
+
+def run_sharded(workers: int, now: datetime = None) -> list:
+    """
+    Process the recurring transactions with one worker process per user_id
+    shard and return everything they posted.
+    """
+    if workers <= 1:
+        return check_recurring_transactions(now)
+
+    # spawn, not fork: the bot process has live threads and pooled connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        results = pool.map(
+            check_recurring_transactions,
+            [now] * workers,
+            range(workers),
+            [workers] * workers
+        )
+        return [row for rows in results for row in rows]
+
+
+# Most posted transactions listed in one notification
+NOTIFY_LIMIT = 10
+
+
+async def post_recurring_transactions(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    JobQueue callback: post due recurring transactions on the database
+    executor, then let each user know what was added for them.
+    """
+    posted = await run_sync(run_sharded, RECURRING_WORKERS)
+    # The worker processes have their own caches; drop this process' stale
+    # summaries for what they posted
+    invalidate_period_summaries(posted)
+
+    by_user = defaultdict(list)
+    for row in posted:
+        by_user[row["user_id"]].append(row)
+
+    for user_id, rows in by_user.items():
+        try:
+            currency = await get_currency(user_id)
+        except NoResultFound:
+            # /recurring works without /start, so the owner may not be a user
+            currency = DEFAULT_CURRENCY
+        currency = escape_markdown(currency or DEFAULT_CURRENCY)
+
+        message = "🔁 *Recurring transactions added:*\n\n"
+        for row in rows[:NOTIFY_LIMIT]:
+            type_prefix = "💰" if row["type_of_transaction"] == "income" else "💸"
+            message += (
+                f"{type_prefix} {row['timestamp'].strftime('%Y-%m-%d')} | "
+                f"{currency} {row['amount']:.2f} | {escape_markdown(row['description'])}\n"
+            )
+        if len(rows) > NOTIFY_LIMIT:
+            message += f"\n…and {len(rows) - NOTIFY_LIMIT} more."
+
+        try:
+            await context.bot.send_message(chat_id=user_id, text=message, parse_mode='Markdown')
+        except TelegramError as error:
+            # e.g. the user blocked the bot; the transactions are saved anyway
+            logger.warning(
+                "Could not notify user %s of recurring transactions: %s", user_id, error)
+
 
+def schedule_recurring_transactions(job_queue: JobQueue) -> None:
+    """
+    Run the recurring job every midnight (local time, like the transactions'
+    timestamps), plus once at startup to catch up on anything missed while
+    the bot was down.
+    """
+    local_midnight = time(0, 0, tzinfo=datetime.now().astimezone().tzinfo)
 
-def start_scheduler():
-    scheduler_thread = threading.Thread(target=run_scheduler)
-    scheduler_thread.daemon = True
-    scheduler_thread.start()
+    job_queue.run_daily(post_recurring_transactions,
+                        time=local_midnight, name="recurring_transactions")
+    job_queue.run_once(post_recurring_transactions,
+                       when=0, name="recurring_transactions_catch_up")
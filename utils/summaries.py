@@ -0,0 +1,148 @@
+"""
+Per-category breakdowns of a week, month or year, and their cache.
+
+utils.database builds a PeriodBreakdown from one grouped query and keeps it
+in a PeriodSummaryCache keyed by (user_id, period_type, year, month, week).
+Whenever transactions are written, the periods they fall in are invalidated.
+That only covers writes made by this process, so entries also expire after a
+while to pick up rows posted by another one (manage.py run-recurring from
+cron, a second bot instance).
+"""
+import threading
+from typing import NamedTuple, Optional
+
+from utils.cache import LRUCache
+
+# Descriptions listed per transaction type in a breakdown
+TOP_DESCRIPTIONS = 5
+
+
+class CategoryTotal(NamedTuple):
+    type_of_transaction: str
+    category_id: int
+    name: Optional[str]  # None if the category was deleted
+    total: float
+    count: int
+
+
+class DescriptionTotal(NamedTuple):
+    type_of_transaction: str
+    description: str
+    total: float
+    count: int
+
+
+class PeriodBreakdown(NamedTuple):
+    total_income: float
+    total_expense: float
+    # Largest first within each type
+    categories: tuple
+    top_descriptions: tuple
+
+    def categories_for(self, type_of_transaction: str) -> tuple:
+        return tuple(c for c in self.categories if c.type_of_transaction == type_of_transaction)
+
+    def top_descriptions_for(self, type_of_transaction: str) -> tuple:
+        return tuple(d for d in self.top_descriptions if d.type_of_transaction == type_of_transaction)
+
+
+def build_breakdown(rows, category_name, top_n: int = TOP_DESCRIPTIONS) -> PeriodBreakdown:
+    """
+    Fold rows of (type_of_transaction, category_id, description, total,
+    count), one per group, into a PeriodBreakdown. category_name(id) resolves
+    category ids to names.
+    """
+    totals = {'income': 0.0, 'expense': 0.0}
+    categories = {}
+    descriptions = {}
+
+    for type_, category_id, description, total, count in rows:
+        totals[type_] = totals.get(type_, 0.0) + total
+
+        category = categories.setdefault((type_, category_id), [0.0, 0])
+        category[0] += total
+        category[1] += count
+
+        # Descriptions are grouped case-insensitively across categories
+        entry = descriptions.setdefault(
+            (type_, description.strip().lower()), [description, 0.0, 0])
+        entry[1] += total
+        entry[2] += count
+
+    category_totals = sorted(
+        (CategoryTotal(type_, category_id, category_name(category_id), total, count)
+         for (type_, category_id), (total, count) in categories.items()),
+        key=lambda c: (c.type_of_transaction, -c.total),
+    )
+
+    top = []
+    for type_ in sorted(totals):
+        ranked = sorted(
+            (DescriptionTotal(type_, description, total, count)
+             for (entry_type, _), (description, total, count) in descriptions.items()
+             if entry_type == type_),
+            key=lambda d: -d.total,
+        )
+        top.extend(ranked[:top_n])
+
+    return PeriodBreakdown(
+        total_income=totals['income'],
+        total_expense=totals['expense'],
+        categories=tuple(category_totals),
+        top_descriptions=tuple(top),
+    )
+
+
+class PeriodSummaryCache:
+    '''Caches a PeriodBreakdown per user and period'''
+
+    def __init__(self, load, maxsize: int = 4096, ttl: float = None):
+        # load(user_id, period_type, year, month, week) -> PeriodBreakdown
+        self._load = load
+        self._entries = LRUCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a write is
+        # not cached
+        self._generation = 0
+
+    @staticmethod
+    def key(user_id: int, period_type: str, year: int, month: int = None, week: int = None):
+        # Only the fields that identify the period are part of the key
+        if period_type == 'year':
+            return (user_id, 'year', year, None, None)
+        if period_type == 'month':
+            return (user_id, 'month', year, month, None)
+        return (user_id, 'week', year, None, week)
+
+    def get(self, user_id: int, period_type: str, year: int, month: int = None, week: int = None) -> PeriodBreakdown:
+        key = self.key(user_id, period_type, year, month, week)
+        breakdown = self._entries.get(key)
+        if breakdown is not None:
+            return breakdown
+
+        generation = self._generation
+        breakdown = self._load(*key)
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries.set(key, breakdown)
+
+        return breakdown
+
+    def invalidate(self, periods):
+        '''Forget the breakdowns covering (user_id, year, month, week) buckets'''
+        with self._lock:
+            self._generation += 1
+            for user_id, year, month, week in periods:
+                self._entries.pop(self.key(user_id, 'year', year))
+                self._entries.pop(self.key(user_id, 'month', year, month=month))
+                self._entries.pop(self.key(user_id, 'week', year, week=week))
+
+    def invalidate_user(self, user_id: int = None):
+        '''Forget all of a user's breakdowns, or everyone's if no user is given'''
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop_where(lambda key: key[0] == user_id)
@@ -0,0 +1,151 @@
+"""
+Concurrent update handling that keeps each chat's updates in order.
+
+PTB can process updates concurrently, but two updates from the same chat
+would then race through the ConversationHandler state machines (a category
+button handled before the amount that precedes it). ChatOrderedUpdateProcessor
+runs different chats in parallel while each chat's updates run one at a time,
+in the order Telegram sent them.
+"""
+import asyncio
+import contextlib
+import time
+from typing import NamedTuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor, ContextTypes
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+class UpdateMetrics(NamedTuple):
+    running: int  # updates in a handler right now
+    waiting: int  # admitted updates waiting for their chat or a free slot
+    peak_waiting: int
+    chats: int  # chats with an update running or waiting
+    processed: int
+    average_wait_ms: float
+
+
+def _chat_key(update: object):
+    '''The id updates are serialized on, or None for updates from no one'''
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Run up to max_concurrent_updates handlers at once, one per chat at a time.
+
+    PTB's own limit (max_pending_updates here) caps the updates admitted,
+    whether running or waiting behind an earlier update from their chat.
+    Updates past it stay queued in the application. The running limit is
+    applied after the chat's turn comes up, so a chat that sends a burst
+    holds at most one running slot.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = 256):
+        super().__init__(max(max_concurrent_updates, max_pending_updates))
+        self.max_running_updates = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # chat id -> [lock, updates holding or waiting for it]
+        self._chats = {}
+        self._running = 0
+        self._waiting = 0
+        self._peak_waiting = 0
+        self._processed = 0
+        self._started = 0
+        self._total_wait = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = _chat_key(update)
+        lock = self._chat_lock(key) if key is not None else contextlib.nullcontext()
+        admitted = time.perf_counter()
+        self._waiting += 1
+        self._peak_waiting = max(self._peak_waiting, self._waiting)
+        waiting = True
+        try:
+            # Lock waiters are woken first in, first out, so a chat's updates
+            # keep the order the application took them in
+            async with lock, self._slots:
+                self._waiting -= 1
+                waiting = False
+                self._started += 1
+                self._total_wait += time.perf_counter() - admitted
+                self._running += 1
+                try:
+                    await coroutine
+                finally:
+                    self._running -= 1
+                    self._processed += 1
+        finally:
+            if waiting:
+                self._waiting -= 1
+            if key is not None:
+                self._release_chat(key)
+
+    def _chat_lock(self, key) -> asyncio.Lock:
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release_chat(self, key) -> None:
+        entry = self._chats[key]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._chats[key]
+
+    def metrics(self, reset_peak: bool = False) -> UpdateMetrics:
+        '''Snapshot of the processor's counters'''
+        metrics = UpdateMetrics(
+            running=self._running,
+            waiting=self._waiting,
+            peak_waiting=self._peak_waiting,
+            chats=len(self._chats),
+            processed=self._processed,
+            average_wait_ms=(self._total_wait / self._started * 1000
+                             if self._started else 0.0),
+        )
+        if reset_peak:
+            self._peak_waiting = self._waiting
+        return metrics
+
+
+async def log_update_metrics(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Log queue depths and throughput since the last run, if anything happened."""
+    application = context.application
+    processor = application.update_processor
+    if not isinstance(processor, ChatOrderedUpdateProcessor):
+        return
+
+    metrics = processor.metrics(reset_peak=True)
+    last = context.job.data or 0
+    context.job.data = metrics.processed
+    queued = application.update_queue.qsize()
+    if metrics.processed == last and not queued and not metrics.waiting:
+        return
+
+    logger.info(
+        "Updates: %d processed, %d running, %d waiting (peak %d) across %d chats, "
+        "%d queued, %.1f ms average wait",
+        metrics.processed - last, metrics.running, metrics.waiting,
+        metrics.peak_waiting, metrics.chats, queued, metrics.average_wait_ms)
@@ -0,0 +1,168 @@
+"""
+Write-behind buffer for new transactions.
+
+Saving a transaction on its own costs a commit, and so an fsync, per logged
+expense. When the buffer is running, handlers hand their transactions to it
+instead and a background task writes whatever has queued up as one batched
+INSERT, once WRITE_BUFFER_MAX_DELAY_MS has passed or WRITE_BUFFER_MAX_ROWS
+rows are waiting. With ack "commit" the handler waits for that commit, with
+"enqueue" it only waits for the queue.
+"""
+import asyncio
+
+from utils import database
+from utils.async_database import run_sync
+from utils.config import (
+    WRITE_BUFFER_ACK,
+    WRITE_BUFFER_ENABLED,
+    WRITE_BUFFER_MAX_DELAY_MS,
+    WRITE_BUFFER_MAX_ROWS,
+)
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+ACK_MODES = ("commit", "enqueue")
+
+
+class TransactionWriteBuffer:
+    '''Groups transactions from handlers into batched commits'''
+
+    def __init__(self, max_rows: int = 100, max_delay_ms: int = 50, ack: str = "commit"):
+        if ack not in ACK_MODES:
+            raise ValueError(f"ack must be one of {ACK_MODES}, got {ack!r}")
+
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max_delay_ms / 1000
+        self.ack = ack
+        self._queue = None
+        self._task = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    async def start(self) -> None:
+        '''Start the background writer on the running event loop'''
+        if self.running:
+            return
+
+        self._queue = asyncio.Queue()
+        self._closing = False
+        self._task = asyncio.create_task(
+            self._run(), name="transaction-write-buffer")
+        logger.info("Write buffer started (max %d rows / %d ms, ack after %s)",
+                    self.max_rows, self.max_delay * 1000, self.ack)
+
+    async def stop(self) -> None:
+        '''Write everything still queued and stop the background writer'''
+        if self._task is None:
+            return
+
+        # New saves bypass the buffer from here on; queued ones are drained
+        # in order before the writer sees the sentinel
+        self._closing = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info("Write buffer flushed and stopped")
+
+    async def save_transaction(self, **values) -> None:
+        '''Queue a transaction, taking the same arguments as database.save_transaction'''
+        if not self.running:
+            await run_sync(database.save_transaction, **values)
+            return
+
+        future = None
+        if self.ack == "commit":
+            future = asyncio.get_running_loop().create_future()
+
+        await self._queue.put((values, future))
+
+        if future is not None:
+            await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.max_delay
+
+            while len(batch) < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._write(batch)
+            if stopping:
+                return
+
+    async def _write(self, batch) -> None:
+        try:
+            await run_sync(database.save_transactions,
+                           [values for values, _ in batch])
+        except Exception:
+            # Don't let one bad row take the rest of the batch down with it
+            logger.exception(
+                "Batched insert of %d transaction(s) failed, retrying one by one", len(batch))
+            for values, future in batch:
+                try:
+                    await run_sync(database.save_transaction, **values)
+                except Exception as error:
+                    logger.exception("Could not save transaction: %s", values)
+                    _resolve(future, error)
+                else:
+                    _resolve(future)
+            return
+
+        for _, future in batch:
+            _resolve(future)
+
+
+def _resolve(future, error: Exception = None) -> None:
+    # The waiting handler may have been cancelled in the meantime
+    if future is None or future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+write_buffer = TransactionWriteBuffer(
+    max_rows=WRITE_BUFFER_MAX_ROWS,
+    max_delay_ms=WRITE_BUFFER_MAX_DELAY_MS,
+    ack=WRITE_BUFFER_ACK,
+)
+
+
+async def start_write_buffer(application=None) -> None:
+    """Start the write buffer if WRITE_BUFFER_ENABLED is set."""
+    if WRITE_BUFFER_ENABLED:
+        await write_buffer.start()
+
+
+async def stop_write_buffer(application=None) -> None:
+    """Flush pending transactions to the database and stop the write buffer."""
+    await write_buffer.stop()